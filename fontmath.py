@@ -0,0 +1,117 @@
+"""
+字号与换行计算 (fontmath)
+
+PPTXMLTranslator 用到的纯计算函数：字号单位换算、标准字号调整，以及按原文换行位置
+对译文分行。这些函数不依赖XML元素，便于复用和单独测试。
+"""
+
+import bisect
+import re
+from typing import List, Sequence
+
+# 译文中可以换行的位置：空格之前或标点之后
+_BOUNDARY_RE = re.compile(r"[ .,:;?!]")
+
+def point_to_size(point_size: float) -> int:
+    """将磅值转换为XML中的字号值（1磅 = 100单位）"""
+    return int(point_size * 100)
+
+def size_to_point(size: int) -> float:
+    """将XML中的字号值转换为磅值"""
+    return size / 100
+
+def next_smaller_size(current_size: float, ascending_sizes: Sequence[float], min_size: float) -> float:
+    """获取下一个更小的标准字号
+    Args:
+        current_size: 当前字号（磅）
+        ascending_sizes: 从小到大排列的标准字号列表（磅）
+        min_size: 最小字号（磅）
+    Returns:
+        下一个更小的标准字号（磅）
+    """
+    # 将当前大小四舍五入到最接近的0.5
+    rounded_size = round(current_size * 2) / 2
+
+    # 二分查找第一个小于等于当前大小的标准字号
+    index = bisect.bisect_right(ascending_sizes, rounded_size) - 1
+    if index >= 2:
+        # 返回后两个标准字号（相当于减小两次）
+        return ascending_sizes[index - 2]
+
+    # 如果已经接近列表末尾，或当前大小小于所有标准字号，返回最小值
+    return min_size
+
+def adjust_font_size(size: int, is_translation: bool, ascending_sizes: Sequence[float], min_size: float) -> int:
+    """调整字体大小
+    Args:
+        size: 原始字体大小（XML字号值）
+        is_translation: 是否是译文，译文再减小一次字号
+        ascending_sizes: 从小到大排列的标准字号列表（磅）
+        min_size: 最小字号（磅）
+    Returns:
+        调整后的字体大小（XML字号值）
+    """
+    # 获取下一个更小的标准字号
+    new_point_size = next_smaller_size(size_to_point(size), ascending_sizes, min_size)
+
+    # 如果是译文，再减小一次字号
+    if is_translation:
+        new_point_size = next_smaller_size(new_point_size, ascending_sizes, min_size)
+
+    # 确保不小于最小字号
+    return point_to_size(max(new_point_size, min_size))
+
+def split_translation(original_text: str, translated_text: str) -> List[str]:
+    """按原文的换行位置对译文进行分行
+
+    按原文各行结束位置占全文的比例计算译文的换行位置，再向后移到最近的空格或标点处
+    Args:
+        original_text: 原文（不能为空）
+        translated_text: 译文
+    Returns:
+        译文各行（已去掉首尾空白，不含空行）
+    """
+    # 记录原文的换行位置
+    line_breaks = []
+    current_pos = 0
+    for line in original_text.split('\n'):
+        current_pos += len(line)
+        line_breaks.append(current_pos)
+
+    translated_lines = []
+    last_pos = 0
+    total_len = len(translated_text)
+    ratio = total_len / len(original_text)
+
+    # 一次扫描找出所有空格和标点：记录它们的位置，以及在此处换行时的分隔位置
+    boundary_starts = []
+    boundary_positions = []
+    for match in _BOUNDARY_RE.finditer(translated_text):
+        boundary_starts.append(match.start())
+        boundary_positions.append(match.start() if match.group() == ' ' else match.end())
+
+    for break_pos in line_breaks:
+        # 按照原文换行位置的比例计算译文的换行位置
+        translated_break_pos = int(break_pos * ratio)
+        # 在最接近的单词边界处换行
+        if translated_break_pos < total_len:
+            # 二分查找向后最近的空格或标点，使用其分隔位置
+            index = bisect.bisect_left(boundary_starts, translated_break_pos)
+            if index < len(boundary_starts):
+                break_pos = boundary_positions[index]
+            else:
+                break_pos = translated_break_pos
+
+            # 提取这一行文本
+            line = translated_text[last_pos:break_pos].strip()
+            if line:
+                translated_lines.append(line)
+            last_pos = break_pos
+
+    # 添加最后一行
+    if last_pos < total_len:
+        last_line = translated_text[last_pos:].strip()
+        if last_line:
+            translated_lines.append(last_line)
+
+    return translated_lines
@@ -1,3 +1,6 @@
+from .backends import TranslationBackend, OllamaBackend, VLLMBackend, LlamaCppServerBackend
 from .translate_service import OllamaTranslator
+from .translation_cache import TranslationCache
 
-__all__ = ['OllamaTranslator'] 
\ No newline at end of file
+__all__ = ['OllamaTranslator', 'TranslationCache', 'TranslationBackend',
+           'OllamaBackend', 'VLLMBackend', 'LlamaCppServerBackend'] 
\ No newline at end of file
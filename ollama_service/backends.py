@@ -0,0 +1,282 @@
+import json
+from typing import Callable, Optional, Protocol
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
+try:
+    import orjson
+except ImportError:  # orjson 是可选依赖，未安装时使用标准库 json
+    orjson = None
+
+def json_dumps(obj) -> bytes:
+    """把对象编码为JSON字节串"""
+    if orjson is not None:
+        return orjson.dumps(obj)
+    return json.dumps(obj, ensure_ascii=False).encode('utf-8')
+
+def json_loads(data):
+    """解析JSON字节串或字符串"""
+    if orjson is not None:
+        return orjson.loads(data)
+    return json.loads(data)
+
+# 手动编码请求体时使用的请求头
+JSON_HEADERS = {'Content-Type': 'application/json'}
+
+class TranslationBackend(Protocol):
+    """文本生成后端接口
+
+    options 统一使用 Ollama 的参数名（temperature、top_p、repeat_penalty、
+    num_predict、stop 等），由各后端转换为自己的请求格式。
+    """
+
+    def generate(self, prompt: str, options: dict, on_token: Optional[Callable[[str], None]] = None) -> str:
+        """以流式方式生成文本，返回完整结果"""
+        ...
+
+    def warmup(self, options: Optional[dict] = None) -> bool:
+        """预加载模型，options 应与之后的请求一致，避免服务端因参数不同重新加载"""
+        ...
+
+    def test_connection(self) -> bool:
+        """测试服务器连接"""
+        ...
+
+    def close(self):
+        """释放连接"""
+        ...
+
+class HTTPBackend:
+    """基于HTTP的后端公共实现：连接池、超时与流式读取"""
+
+    # 请求超时（连接超时, 读取超时），单位秒
+    REQUEST_TIMEOUT = (3.05, 120)
+
+    # 健康检查接口路径
+    HEALTH_PATH = "/"
+
+    def __init__(self, model_name: str, host: str):
+        self.model_name = model_name
+        self.host = host.rstrip('/')  # 移除末尾的斜杠
+        self._session = self._create_session()
+
+    def _create_session(self) -> requests.Session:
+        """创建复用连接的HTTP会话（keep-alive + 连接池 + 失败重试）"""
+        session = requests.Session()
+        retry = Retry(
+            total=3,
+            backoff_factor=0.2,
+            status_forcelist=[502, 503, 504],
+            allowed_methods=frozenset(["GET", "POST"])
+        )
+        adapter = HTTPAdapter(pool_connections=8, pool_maxsize=32, max_retries=retry)
+        session.mount('http://', adapter)
+        session.mount('https://', adapter)
+        return session
+
+    def close(self):
+        """关闭HTTP会话，释放连接池"""
+        session = getattr(self, '_session', None)
+        if session is not None:
+            session.close()
+            self._session = None
+
+    def __del__(self):
+        self.close()
+
+    def test_connection(self) -> bool:
+        try:
+            response = self._session.get(f"{self.host}{self.HEALTH_PATH}", timeout=self.REQUEST_TIMEOUT)
+            return response.status_code == 200
+        except Exception as e:
+            print(f"连接测试失败: {str(e)}")
+            return False
+
+    def warmup(self, options: Optional[dict] = None) -> bool:
+        try:
+            self.generate(" ", {**(options or {}), "num_predict": 1})
+            return True
+        except Exception as e:
+            print(f"模型预加载失败: {str(e)}")
+            return False
+
+    def _post_json(self, url: str, payload: dict, **kwargs) -> requests.Response:
+        """以JSON请求体发送POST请求"""
+        return self._session.post(url, data=json_dumps(payload), headers=JSON_HEADERS,
+                                  timeout=self.REQUEST_TIMEOUT, **kwargs)
+
+    def _stream(self, url: str, payload: dict, parse_line: Callable[[bytes], tuple],
+                on_token: Optional[Callable[[str], None]] = None) -> str:
+        """发送流式请求
+        Args:
+            url: 接口地址
+            payload: 请求体
+            parse_line: 把一行响应解析为 (文本片段, 是否结束)，空行或无内容时返回 ("", False)
+            on_token: 每收到一段生成文本时的回调（可选）
+        Returns:
+            完整的生成文本
+        """
+        chunks = []
+        done = False
+        with self._post_json(url, payload, stream=True) as response:
+            response.raise_for_status()
+            # 收到结束标记后继续读完响应体（如 vLLM 的 [DONE] 和分块编码的结尾），
+            # 未读完就关闭时连接会被丢弃，无法放回连接池复用
+            for line in response.iter_lines():
+                if done or not line:
+                    continue
+                token, done = parse_line(line)
+                if token:
+                    chunks.append(token)
+                    if on_token:
+                        on_token(token)
+        return ''.join(chunks).strip()
+
+    @staticmethod
+    def _sse_data(line: bytes) -> Optional[dict]:
+        """解析SSE格式的一行（data: {...}），[DONE] 或非数据行返回 None"""
+        if not line.startswith(b"data:"):
+            return None
+        data = line[5:].strip()
+        if not data or data == b"[DONE]":
+            return None
+        return json_loads(data)
+
+class OllamaBackend(HTTPBackend):
+    """Ollama 后端（/api/generate）"""
+
+    HEALTH_PATH = "/api/version"
+
+    # 模型在两次请求之间保持加载的时间，避免逐页翻译时被卸载
+    KEEP_ALIVE = "30m"
+
+    def __init__(self, model_name: str, host: str):
+        super().__init__(model_name, host)
+        self.api_url = f"{self.host}/api/generate"
+
+    def generate(self, prompt: str, options: dict, on_token: Optional[Callable[[str], None]] = None) -> str:
+        payload = {
+            "model": self.model_name,
+            "prompt": prompt,
+            "stream": True,
+            "options": options,
+            "keep_alive": self.KEEP_ALIVE
+        }
+        return self._stream(self.api_url, payload, self._parse_line, on_token)
+
+    @staticmethod
+    def _parse_line(line: bytes) -> tuple:
+        # 服务器逐行返回JSON，每行包含一段生成文本
+        chunk = json_loads(line)
+        if "error" in chunk:
+            raise RuntimeError(chunk["error"])
+        return chunk.get("response", ""), bool(chunk.get("done"))
+
+    def warmup(self, options: Optional[dict] = None) -> bool:
+        payload = {
+            "model": self.model_name,
+            "prompt": " ",
+            "stream": False,
+            # 与之后的请求使用相同的 num_ctx 等参数，否则第一次翻译时模型会被重新加载
+            "options": {**(options or {}), "num_predict": 1},
+            "keep_alive": self.KEEP_ALIVE
+        }
+        try:
+            response = self._post_json(self.api_url, payload)
+            response.raise_for_status()
+            return True
+        except Exception as e:
+            print(f"模型预加载失败: {str(e)}")
+            return False
+
+class VLLMBackend(HTTPBackend):
+    """vLLM 后端（OpenAI 兼容的 /v1/completions），可加载 AWQ/GPTQ/FP8 量化模型"""
+
+    HEALTH_PATH = "/v1/models"
+
+    def __init__(self, model_name: str, host: str):
+        super().__init__(model_name, host)
+        self.api_url = f"{self.host}/v1/completions"
+
+    def generate(self, prompt: str, options: dict, on_token: Optional[Callable[[str], None]] = None) -> str:
+        payload = {
+            "model": self.model_name,
+            "prompt": prompt,
+            "stream": True,
+            "max_tokens": options.get("num_predict", 256),
+            "temperature": options.get("temperature", 0),
+            "top_p": options.get("top_p", 1),
+            "repetition_penalty": options.get("repeat_penalty", 1.0),
+        }
+        if options.get("stop"):
+            payload["stop"] = options["stop"]
+        return self._stream(self.api_url, payload, self._parse_line, on_token)
+
+    @classmethod
+    def _parse_line(cls, line: bytes) -> tuple:
+        if line.strip() == b"data: [DONE]":
+            return "", True
+        data = cls._sse_data(line)
+        if not data:
+            return "", False
+        if "error" in data:
+            raise RuntimeError(data["error"])
+        choice = data["choices"][0]
+        return choice.get("text", ""), choice.get("finish_reason") is not None
+
+class LlamaCppServerBackend(HTTPBackend):
+    """llama.cpp 自带的 llama-server 后端（/completion）"""
+
+    HEALTH_PATH = "/health"
+
+    def __init__(self, model_name: str, host: str):
+        super().__init__(model_name, host)
+        self.api_url = f"{self.host}/completion"
+
+    def generate(self, prompt: str, options: dict, on_token: Optional[Callable[[str], None]] = None) -> str:
+        payload = {
+            "prompt": prompt,
+            "stream": True,
+            "n_predict": options.get("num_predict", 256),
+            "temperature": options.get("temperature", 0),
+            "top_p": options.get("top_p", 1),
+            "repeat_penalty": options.get("repeat_penalty", 1.0),
+            "stop": options.get("stop", []),
+            # 复用相同提示词前缀的KV缓存
+            "cache_prompt": True
+        }
+        return self._stream(self.api_url, payload, self._parse_line, on_token)
+
+    @classmethod
+    def _parse_line(cls, line: bytes) -> tuple:
+        data = cls._sse_data(line)
+        if not data:
+            return "", False
+        if "error" in data:
+            raise RuntimeError(data["error"])
+        return data.get("content", ""), bool(data.get("stop"))
+
+# 模型名前缀与后端的对应关系，例如 "vllm:Qwen/Qwen2.5-7B-Instruct-AWQ"
+BACKENDS = {
+    "ollama": OllamaBackend,
+    "vllm": VLLMBackend,
+    "llamacpp": LlamaCppServerBackend,
+}
+
+def parse_model_spec(model_spec: str) -> tuple:
+    """拆分带后端前缀的模型名
+    Args:
+        model_spec: 模型名，可带 "ollama:"、"vllm:"、"llamacpp:" 前缀，不带前缀时使用 Ollama
+    Returns:
+        (后端名称, 模型名称) 的元组
+    """
+    prefix, sep, rest = model_spec.partition(':')
+    if sep and prefix in BACKENDS:
+        return prefix, rest
+    return "ollama", model_spec
+
+def create_backend(model_spec: str, host: str) -> TranslationBackend:
+    """根据模型名前缀创建对应的后端"""
+    backend_name, model_name = parse_model_spec(model_spec)
+    return BACKENDS[backend_name](model_name, host)
@@ -1,6 +1,70 @@
-import requests
-import json
-from typing import Literal, Optional
+import os
+import re
+import threading
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import Callable, Literal, Optional
+from .backends import create_backend, parse_model_spec
+from .translation_cache import TranslationCache
+
+# 模型常在译文前添加的前缀
+PREFIXES = [
+    "translation:", "here's the translation:", "translated text:",
+    "翻译:", "译文:", "中文翻译:", "英文翻译:",
+    "transliteration:", "explanation:", "note:", "chinese:", "english:"
+]
+
+# 模型常混入译文的说明性文本
+EXPLANATIONS = [
+    "only the translation is provided",
+    "only translation returned",
+    "direct translation:",
+    "translated version:",
+    "translation result:",
+    "chinese text:",
+    "english text:",
+    "original text:"
+]
+
+def _alternation(words) -> str:
+    """把词表编译为正则选择分支，长词优先匹配"""
+    return '|'.join(map(re.escape, sorted(words, key=len, reverse=True)))
+
+_PREFIX_RE = re.compile(r'^(?:(?:' + _alternation(PREFIXES) + r')\s*)+', re.IGNORECASE)
+_EXPL_RE = re.compile(_alternation(EXPLANATIONS), re.IGNORECASE)
+
+# 中译英：删除译文中残留的汉字
+_ZH2EN_DROP_RE = re.compile(r'[\u4e00-\u9fff]')
+# 英译中：只保留汉字和基本标点
+_EN2ZH_DROP_RE = re.compile(r'[^\u4e00-\u9fff，。！？、（）:;,.!?()\- ]')
+
+# 判断原文是否需要翻译：中文原文需含汉字，英文原文需含至少两个连续字母
+_CJK_RE = re.compile(r'[\u4e00-\u9fff]')
+_ALPHA_RE = re.compile(r'[A-Za-z]{2,}')
+
+def _needs_translation(text: str, from_lang: str) -> bool:
+    """判断文本是否需要发送给模型翻译
+    
+    页码、日期、百分比、网址以及已经是目标语言的文本原样保留，不调用模型
+    """
+    if not text or not text.strip():
+        return False
+    if from_lang == "zh":
+        return bool(_CJK_RE.search(text))
+    if from_lang == "en":
+        return bool(_ALPHA_RE.search(text))
+    return True
+
+# 解析批量译文中的编号片段：<<N>> 译文
+_SEG_RE = re.compile(r'<<(\d+)>>\s*(.*?)(?=<<\d+>>|\Z)', re.DOTALL)
+
+def _precompile(template: str):
+    """把提示词模板预先按 {text} 占位符拆分为字面量，返回 render(text) 函数"""
+    literals = template.split("{text}")
+    
+    def render(text: str) -> str:
+        return text.join(literals)
+    
+    return render
 
 class OllamaTranslator:
     # 支持的模型列表
@@ -8,10 +72,13 @@ class OllamaTranslator:
         "qwen:7b": {
             "zh2en_prompt": "Translate this Chinese text to English. Only return the translation:{text}",
             "en2zh_prompt": "Translate this English text to Chinese. Only return the translation:{text}",
-            "zh2en_batch_prompt": """Translate these Chinese texts to English. Return each translation separated by "{separator}" without any prefix or explanation:
+            "zh2en_batch_prompt": """Translate these Chinese texts to English. Each text starts with a marker like <<N>>. Start each translation with the same <<N>> marker, where N is the 1-based index of its text, without any other prefix or explanation:
+{text}""",
+            "en2zh_batch_prompt": """Translate these English texts to Chinese. Each text starts with a marker like <<N>>. Start each translation with the same <<N>> marker, where N is the 1-based index of its text, without any other prefix or explanation:
 {text}""",
-            "en2zh_batch_prompt": """Translate these English texts to Chinese. Return each translation separated by "{separator}" without any prefix or explanation:
-{text}"""
+            # 批量翻译每个微批次的字符上限和条目上限
+            "batch_max_chars": 1200,
+            "batch_max_items": 6
         },
         "llama3:8b": {
             "zh2en_prompt": """<s>[INST] You are a professional translator. Follow these rules strictly:
@@ -36,7 +103,7 @@ Text to translate:
 [/INST]""",
             "zh2en_batch_prompt": """<s>[INST] You are a professional translator. Follow these rules strictly:
 1. Translate these Chinese texts to English
-2. Return ONLY the translations, separated by "{separator}"
+2. Return ONLY the translations, each starting with the <<N>> marker of its text (N is the 1-based index)
 3. No explanations or notes
 4. No prefixes like 'Translation:'
 5. Keep original punctuation style
@@ -46,45 +113,97 @@ Texts to translate:
 [/INST]""",
             "en2zh_batch_prompt": """<s>[INST] You are a professional translator. Follow these rules strictly:
 1. Translate these English texts to Chinese
-2. Return ONLY the translations, separated by "{separator}"
+2. Return ONLY the translations, each starting with the <<N>> marker of its text (N is the 1-based index)
 3. No explanations or notes
 4. No prefixes like '翻译:'
 5. Keep original punctuation style
 
 Texts to translate:
 {text}
-[/INST]"""
+[/INST]""",
+            "batch_max_chars": 2000,
+            "batch_max_items": 8
         }
     }
     
-    def __init__(self, model_name: str = "qwen:7b", host: str = "http://localhost:2342"):
+    # 批量翻译时每条文本的编号标记，例如 <<1>>
+    BATCH_MARKER = "<<{}>>"
+    
+    # 不在 SUPPORTED_MODELS 中的模型（包括其他 Ollama 模型）使用的通用提示词
+    GENERIC_MODEL_CONFIG = SUPPORTED_MODELS["qwen:7b"]
+    
+    # 翻译使用的默认生成参数：关闭随机采样，限制上下文和停止条件
+    # num_ctx 在同一个翻译器内保持不变，否则 Ollama 会重新加载模型
+    DEFAULT_GEN_OPTIONS = {
+        "temperature": 0,
+        "top_p": 1,
+        "repeat_penalty": 1.0,
+        "num_ctx": 4096,
+        "num_batch": 512,
+        "stop": ["\n\n", "[/INST]", "</s>"]
+    }
+    
+    def __init__(self, model_name: str = "qwen:7b", host: str = "http://localhost:2342", n_parallel: Optional[int] = None,
+                 max_chars: Optional[int] = None, max_items: Optional[int] = None,
+                 cache_path: Optional[str] = None, cache_size: int = 4096,
+                 gen_options: Optional[dict] = None):
         """初始化翻译器
         Args:
-            model_name: 模型名称，支持 "qwen:7b" 或 "llama3:8b"
-            host: Ollama服务器地址
+            model_name: 模型名称，"qwen:7b" 和 "llama3:8b" 使用专门的提示词，其他模型使用通用提示词；
+                加 "vllm:" 或 "llamacpp:" 前缀时改用对应的推理服务，例如 "vllm:Qwen/Qwen2.5-7B-Instruct-AWQ"
+            host: 推理服务地址
+            n_parallel: 并发翻译时同时进行的最大请求数，默认读取环境变量 OLLAMA_PARALLEL（未设置时为4），
+                建议与Ollama服务端的 OLLAMA_NUM_PARALLEL 一致
+            max_chars: 批量翻译时每个微批次的字符上限，默认使用模型配置
+            max_items: 批量翻译时每个微批次的条目上限，默认使用模型配置
+            cache_path: 翻译结果磁盘缓存（SQLite）路径，为 None 时只在内存中缓存
+            cache_size: 内存缓存的最大条目数
+            gen_options: 覆盖默认值的生成参数（可选，使用Ollama的参数名）
         """
-        if model_name not in self.SUPPORTED_MODELS:
-            raise ValueError(f"不支持的模型: {model_name}。支持的模型有: {list(self.SUPPORTED_MODELS.keys())}")
-        
-        self.model_name = model_name
+        backend_name, served_model = parse_model_spec(model_name)
+        self.backend_name = backend_name
+        self.model_name = served_model
+        # 缓存键使用的模型标识，不同后端的同名模型分开缓存
+        self.model_id = served_model if backend_name == "ollama" else f"{backend_name}:{served_model}"
         self.host = host.rstrip('/')  # 移除末尾的斜杠
-        self.api_url = f"{self.host}/api/generate"
-        self.model_config = self.SUPPORTED_MODELS[model_name]
+        self.model_config = self.SUPPORTED_MODELS.get(served_model, self.GENERIC_MODEL_CONFIG)
+        # 预编译提示词模板，键为 (是否中译英, 是否批量)
+        self._prompt_fns = {
+            (True, False): _precompile(self.model_config["zh2en_prompt"]),
+            (False, False): _precompile(self.model_config["en2zh_prompt"]),
+            (True, True): _precompile(self.model_config["zh2en_batch_prompt"]),
+            (False, True): _precompile(self.model_config["en2zh_batch_prompt"]),
+        }
+        if n_parallel is None:
+            n_parallel = int(os.getenv("OLLAMA_PARALLEL", "4"))
+        self.n_parallel = max(1, n_parallel)
+        # 所有请求共用的并发名额：按页、按批次或逐条回退翻译时再嵌套的线程，同时发出的请求总数也不超过 n_parallel
+        self._request_slots = threading.BoundedSemaphore(self.n_parallel)
+        self.max_chars = max_chars or self.model_config["batch_max_chars"]
+        self.max_items = max_items or self.model_config["batch_max_items"]
+        self._gen_options = {**self.DEFAULT_GEN_OPTIONS, **(gen_options or {})}
+        self.backend = create_backend(model_name, self.host)
+        self._cache = TranslationCache(cache_path, max_size=cache_size)
+        # 正在翻译中的文本，键为缓存键，值为等待译文的 Future；多页并发翻译时相同文本只请求一次
+        self._inflight = {}
+        self._inflight_lock = threading.Lock()
+    
+    def close(self):
+        """关闭后端连接和翻译缓存"""
+        backend = getattr(self, 'backend', None)
+        if backend is not None:
+            backend.close()
+        cache = getattr(self, '_cache', None)
+        if cache is not None:
+            cache.close()
+    
+    def __del__(self):
+        self.close()
     
     def get_prompt(self, text: str, from_lang: str, to_lang: str, is_batch: bool = False) -> str:
         """根据模型和翻译方向获取对应的提示词"""
-        if is_batch:
-            if from_lang == "zh" and to_lang == "en":
-                template = self.model_config["zh2en_batch_prompt"]
-            else:
-                template = self.model_config["en2zh_batch_prompt"]
-        else:
-            if from_lang == "zh" and to_lang == "en":
-                template = self.model_config["zh2en_prompt"]
-            else:
-                template = self.model_config["en2zh_prompt"]
-        
-        return template.format(text=text, separator="|||" if is_batch else "")
+        render = self._prompt_fns[(from_lang == "zh" and to_lang == "en", is_batch)]
+        return render(text)
     
     def clean_translation(self, text: str, from_lang="zh", to_lang="en") -> str:
         """清理翻译结果中的多余格式"""
@@ -101,44 +220,21 @@ Texts to translate:
             text = text.replace("Assistant:", "").replace("Human:", "")
         
         # 移除翻译相关的前缀
-        prefixes = [
-            "translation:", "here's the translation:", "translated text:",
-            "翻译:", "译文:", "中文翻译:", "英文翻译:",
-            "transliteration:", "explanation:", "note:", "chinese:", "english:"
-        ]
-        for prefix in prefixes:
-            if text.lower().startswith(prefix):
-                text = text[len(prefix):].strip()
+        text = _PREFIX_RE.sub('', text, count=1)
         
         # 移除多余的引号和括号
-        text = text.strip('"').strip("'")
-        text = text.strip('(').strip(')')
-        text = text.strip('[').strip(']')
+        text = text.strip('"\'()[]')
         
         # 移除常见的说明性文本
-        explanations = [
-            "only the translation is provided",
-            "only translation returned",
-            "direct translation:",
-            "translated version:",
-            "translation result:",
-            "chinese text:",
-            "english text:",
-            "original text:"
-        ]
-        for exp in explanations:
-            text = text.lower().replace(exp, "").strip()
+        text = _EXPL_RE.sub('', text).strip()
         
         # 如果是中译英，保留英文和标点
         if from_lang == "zh" and to_lang == "en":
-            # 保留英文字符、数字、空格和标点符号
-            allowed_chars = set('abcdefghijklmnopqrstuvwxyzABCDEFGHIJKLMNOPQRSTUVWXYZ0123456789 .,!?;:\'"-()[]{}/')
-            # 创建一个转换表，保留允许的字符和标点
-            text = ''.join(c for c in text if c in allowed_chars or ord(c) < 0x4e00 or ord(c) > 0x9fff)
+            # 保留英文字符、数字、空格和标点符号，去掉汉字
+            text = _ZH2EN_DROP_RE.sub('', text)
         elif from_lang == "en" and to_lang == "zh":
             # 如果是英译中，保留中文和基本标点
-            allowed_chars = set('，。！？、（）:;,.!?()- ')
-            text = ''.join(c for c in text if c in allowed_chars or '\u4e00' <= c <= '\u9fff')
+            text = _EN2ZH_DROP_RE.sub('', text)
         
         # 清理多余的空格
         text = ' '.join(text.split())
@@ -150,102 +246,240 @@ Texts to translate:
         Returns:
             bool: 连接是否成功
         """
-        try:
-            response = requests.get(f"{self.host}/api/version")
-            return response.status_code == 200
-        except Exception as e:
-            print(f"连接测试失败: {str(e)}")
-            return False
+        return self.backend.test_connection()
+    
+    def warmup(self) -> bool:
+        """预加载模型，避免第一次翻译时等待模型加载
+        Returns:
+            bool: 预加载是否成功
+        """
+        # 使用与翻译请求相同的生成参数，预加载的模型才能被后续请求直接复用
+        return self.backend.warmup({**self._gen_options, "num_predict": 1})
     
-    def translate(self, text: str, from_lang: str = "zh", to_lang: str = "en") -> str:
-        """翻译单个文本"""
-        if not text or not text.strip():
+    def _options_for(self, text: str) -> dict:
+        """根据原文长度生成本次请求的生成参数，限制最大生成长度"""
+        options = dict(self._gen_options)
+        options["num_predict"] = max(32, int(len(text) * 1.5))
+        # 多段落的原文，模型常在各段译文之间空一行，此时不能在空行处停止，否则只保留第一段
+        if "\n" in text:
+            options["stop"] = [stop for stop in options.get("stop", []) if stop != "\n\n"]
+        return options
+    
+    def _generate(self, prompt: str, on_token: Optional[Callable[[str], None]] = None,
+                  options: Optional[dict] = None) -> str:
+        """以流式方式调用后端生成接口
+        Args:
+            prompt: 提示词
+            on_token: 每收到一段生成文本时的回调（可选）
+            options: 本次请求的生成参数（可选，默认使用 DEFAULT_GEN_OPTIONS）
+        Returns:
+            完整的生成文本
+        """
+        with self._request_slots:
+            return self.backend.generate(prompt, options if options is not None else self._gen_options, on_token)
+    
+    def translate(self, text: str, from_lang: str = "zh", to_lang: str = "en",
+                  on_token: Optional[Callable[[str], None]] = None) -> str:
+        """翻译单个文本
+        Args:
+            text: 原文
+            from_lang: 源语言
+            to_lang: 目标语言
+            on_token: 流式生成时每收到一段文本的回调（可选）
+        """
+        # 空白、纯数字等无需翻译的文本原样返回
+        if not _needs_translation(text, from_lang):
             return text
         
+        # 命中缓存时直接返回
+        key = TranslationCache.make_key(self.model_id, from_lang, to_lang, text)
+        cached = self._cache.get(key)
+        if cached is not None:
+            return cached
+        
         # 获取对应的提示词
         prompt = self.get_prompt(text, from_lang, to_lang)
         
-        payload = {
-            "model": self.model_name,
-            "prompt": prompt,
-            "stream": False
-        }
-        
         try:
-            response = requests.post(self.api_url, json=payload)
-            response.raise_for_status()
-            result = response.json()
-            translated_text = result.get("response", "").strip()
+            translated_text = self._generate(prompt, on_token, self._options_for(text))
             
             # 清理翻译结果
             cleaned_text = self.clean_translation(translated_text, from_lang, to_lang)
+            if not cleaned_text.strip():
+                return f"[Translation Error for: {text}]"
             
-            return cleaned_text if cleaned_text.strip() else f"[Translation Error for: {text}]"
+            self._cache.set(key, cleaned_text)
+            return cleaned_text
             
         except Exception as e:
             print(f"翻译出错: {str(e)}")
             return f"[Translation Error for: {text}]"
 
-    def batch_translate(self, texts: list, from_lang: str = "zh", to_lang: str = "en") -> list:
-        """批量翻译文本列表"""
-        if not texts:
-            return []
+    def _map_parallel(self, func, items: list) -> list:
+        """在线程池中并发执行 func(item)，结果保持原始顺序
+        
+        请求阻塞在网络I/O上时会释放GIL，多个线程即可让服务器同时处理多个请求；
+        同时发出的请求数由 _generate 中共用的并发名额限制在 n_parallel 以内
+        """
+        if len(items) <= 1:
+            return [func(item) for item in items]
+        with ThreadPoolExecutor(max_workers=min(self.n_parallel, len(items))) as executor:
+            return list(executor.map(func, items))
+    
+    def concurrent_translate(self, texts: list, from_lang: str = "zh", to_lang: str = "en",
+                             on_token: Optional[Callable[[str], None]] = None) -> list:
+        """并发逐个翻译文本列表，最多同时进行 n_parallel 个请求，结果保持原始顺序"""
+        return self._map_parallel(lambda text: self.translate(text, from_lang, to_lang, on_token), texts)
+    
+    def _bucket(self, texts: list, max_chars: int = 2000, max_items: int = 8) -> list:
+        """按文本长度分组，生成微批次
+        Args:
+            texts: 文本列表
+            max_chars: 每个批次的字符上限（含编号标记）
+            max_items: 每个批次的条目上限
+        Returns:
+            批次列表，每个批次是原始文本下标的列表
+        """
+        order = sorted(range(len(texts)), key=lambda i: len(texts[i]))
+        # 每条文本额外的 "<<N>> " 标记和换行
+        sep_len = len(self.BATCH_MARKER.format(max_items)) + 2
+        buckets = []
+        current = []
+        current_chars = 0
+        for i in order:
+            length = len(texts[i])
+            # 长度相近的文本放在同一批次，超过预算时开启新批次
+            if current and (current_chars + sep_len + length > max_chars or len(current) >= max_items):
+                buckets.append(current)
+                current = []
+                current_chars = 0
+            current_chars += length + (sep_len if current else 0)
+            current.append(i)
+        if current:
+            buckets.append(current)
+        return buckets
+    
+    def _translate_bucket(self, texts: list, from_lang: str = "zh", to_lang: str = "en",
+                          on_token: Optional[Callable[[str], None]] = None) -> list:
+        """用一个提示词翻译一个微批次"""
+        if len(texts) == 1:
+            return [self.translate(texts[0], from_lang, to_lang, on_token)]
         
-        # 用特殊分隔符组合所有文本
-        separator = "|||"
-        combined_text = f"{separator}".join(texts)
+        # 为每条文本加上编号标记后组合
+        combined_text = "\n".join(f"{self.BATCH_MARKER.format(i)} {text}" for i, text in enumerate(texts, 1))
         
         # 获取对应的批量翻译提示词
         prompt = self.get_prompt(combined_text, from_lang, to_lang, is_batch=True)
         
-        payload = {
-            "model": self.model_name,
-            "prompt": prompt,
-            "stream": False
-        }
+        # 多条译文之间可能有空行，组合后的文本含有换行，_options_for 会去掉空行停止条件
+        options = self._options_for(combined_text)
         
         try:
-            response = requests.post(self.api_url, json=payload)
-            response.raise_for_status()
-            result = response.json()
-            translated_text = result.get("response", "").strip()
-            
-            # 分割译文
-            translations = [t.strip() for t in translated_text.split(separator) if t.strip()]
-            
-            # 确保每个翻译都有实际内容
-            translations = [t for t in translations if t and not t.isspace()]
-            
-            # 验证和清理每个翻译结果
-            cleaned_translations = []
-            for i, trans in enumerate(translations):
-                # 清理翻译结果
-                cleaned_text = self.clean_translation(trans, from_lang, to_lang)
-                
-                # 确保有实际内容
-                if cleaned_text.strip():
-                    cleaned_translations.append(cleaned_text)
-                else:
-                    print(f"警告：第{i+1}个文本的翻译结果为空")
-                    if i < len(texts):
-                        cleaned_translations.append(f"[Translation Error for: {texts[i]}]")
-            
-            # 确保译文数量与原文相同
-            if len(cleaned_translations) != len(texts):
-                print(f"警告：译文数量({len(cleaned_translations)})与原文数量({len(texts)})不匹配")
-                print("正在尝试逐个翻译...")
-                
-                # 如果批量翻译失败，尝试逐个翻译
-                while len(cleaned_translations) < len(texts):
-                    idx = len(cleaned_translations)
-                    single_translation = self.translate(texts[idx], from_lang, to_lang)
-                    cleaned_translations.append(single_translation)
-            
-            return cleaned_translations
-            
+            translated_text = self._generate(prompt, on_token, options)
         except Exception as e:
             print(f"批量翻译出错: {str(e)}")
             print("正在尝试逐个翻译...")
             
-            # 如果批量翻译失败，改用逐个翻译
-            return [self.translate(text, from_lang, to_lang) for text in texts]
\ No newline at end of file
+            # 如果批量翻译失败，改用并发逐个翻译
+            return self.concurrent_translate(texts, from_lang, to_lang, on_token)
+        
+        # 按编号解析译文，同一编号出现多次时保留第一次
+        segments = {}
+        for match in _SEG_RE.finditer(translated_text):
+            segments.setdefault(int(match.group(1)), match.group(2))
+        
+        # 清理每个翻译结果，缺失或为空的条目记下来单独翻译
+        translations = [None] * len(texts)
+        missing = []
+        for i in range(len(texts)):
+            cleaned_text = self.clean_translation(segments.get(i + 1, ""), from_lang, to_lang)
+            if cleaned_text and cleaned_text.strip():
+                translations[i] = cleaned_text
+            else:
+                missing.append(i)
+        
+        if missing:
+            print(f"警告：{len(texts)}条文本中有{len(missing)}条未能从批量结果中解析，正在逐个翻译...")
+            retried = self.concurrent_translate([texts[i] for i in missing], from_lang, to_lang, on_token)
+            for i, translation in zip(missing, retried):
+                translations[i] = translation
+        
+        return translations
+    
+    def batch_translate(self, texts: list, from_lang: str = "zh", to_lang: str = "en",
+                        on_token: Optional[Callable[[str], None]] = None) -> list:
+        """批量翻译文本列表
+        
+        按长度把文本分成若干微批次，各批次并发翻译，结果保持原始顺序
+        """
+        if not texts:
+            return []
+        
+        # 跳过无需翻译的文本并查缓存，只把未命中的文本发送给模型
+        results = [None] * len(texts)
+        keys = {}
+        misses = []
+        for i, text in enumerate(texts):
+            if not _needs_translation(text, from_lang):
+                results[i] = text
+                continue
+            keys[i] = TranslationCache.make_key(self.model_id, from_lang, to_lang, text)
+            cached = self._cache.get(keys[i])
+            if cached is not None:
+                results[i] = cached
+            else:
+                misses.append(i)
+        if not misses:
+            return results
+        
+        # 相同文本只翻译一次：同一批次中的重复文本合并，其他线程正在翻译的文本等待其结果
+        indexes = {}
+        owned = {}
+        waiting = {}
+        with self._inflight_lock:
+            for i in misses:
+                key = keys[i]
+                if key in indexes:
+                    indexes[key].append(i)
+                    continue
+                indexes[key] = [i]
+                future = self._inflight.get(key)
+                if future is None:
+                    self._inflight[key] = owned[key] = Future()
+                else:
+                    waiting[key] = future
+        
+        try:
+            if owned:
+                owned_keys = list(owned)
+                miss_texts = [texts[indexes[key][0]] for key in owned_keys]
+                buckets = self._bucket(miss_texts, self.max_chars, self.max_items)
+                bucket_results = self._map_parallel(
+                    lambda bucket: self._translate_bucket([miss_texts[i] for i in bucket], from_lang, to_lang, on_token),
+                    buckets
+                )
+                
+                # 按原始下标还原顺序，并写入缓存
+                for bucket, translations in zip(buckets, bucket_results):
+                    for i, translation in zip(bucket, translations):
+                        key = owned_keys[i]
+                        for index in indexes[key]:
+                            results[index] = translation
+                        if not translation.startswith("[Translation Error for:"):
+                            self._cache.set(key, translation)
+                        owned[key].set_result(translation)
+        finally:
+            # 出错时也要唤醒等待的线程，未完成的条目由它们自行翻译
+            with self._inflight_lock:
+                for key, future in owned.items():
+                    del self._inflight[key]
+                    if not future.done():
+                        future.set_result(None)
+        
+        for key, future in waiting.items():
+            translation = future.result()
+            if translation is None:
+                translation = self.translate(texts[indexes[key][0]], from_lang, to_lang, on_token)
+            for index in indexes[key]:
+                results[index] = translation
+        return results
@@ -0,0 +1,83 @@
+import hashlib
+import os
+import sqlite3
+import threading
+from collections import OrderedDict
+from typing import Optional
+
+class TranslationCache:
+    """两级翻译缓存：进程内LRU + 可选的SQLite磁盘缓存
+
+    键为 (模型, 源语言, 目标语言, 原文) 的 sha1 摘要，线程安全。
+    """
+
+    def __init__(self, path: Optional[str] = None, max_size: int = 4096):
+        """初始化缓存
+        Args:
+            path: SQLite缓存文件路径，为 None 时只使用内存缓存
+            max_size: 内存缓存的最大条目数
+        """
+        self.max_size = max_size
+        self._memory = OrderedDict()
+        self._lock = threading.Lock()
+        self._db = None
+        if path:
+            try:
+                os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+                self._db = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+                self._db.execute("PRAGMA journal_mode=WAL")
+                self._db.execute("PRAGMA synchronous=NORMAL")
+                self._db.execute(
+                    "CREATE TABLE IF NOT EXISTS translations (key BLOB PRIMARY KEY, value TEXT NOT NULL)"
+                )
+            except sqlite3.Error as e:
+                print(f"打开翻译缓存失败，仅使用内存缓存: {e}")
+                self._db = None
+
+    @staticmethod
+    def make_key(model_name: str, from_lang: str, to_lang: str, text: str) -> bytes:
+        """生成缓存键"""
+        return hashlib.sha1(f"{model_name}|{from_lang}|{to_lang}|{text}".encode('utf-8')).digest()
+
+    def get(self, key: bytes) -> Optional[str]:
+        """读取缓存，未命中返回 None"""
+        with self._lock:
+            value = self._memory.get(key)
+            if value is not None:
+                self._memory.move_to_end(key)
+                return value
+            if self._db is None:
+                return None
+            try:
+                row = self._db.execute("SELECT value FROM translations WHERE key = ?", (key,)).fetchone()
+            except sqlite3.Error as e:
+                print(f"读取翻译缓存失败: {e}")
+                return None
+            if row is None:
+                return None
+            self._remember(key, row[0])
+            return row[0]
+
+    def set(self, key: bytes, value: str):
+        """写入缓存"""
+        with self._lock:
+            self._remember(key, value)
+            if self._db is not None:
+                try:
+                    self._db.execute("INSERT OR REPLACE INTO translations (key, value) VALUES (?, ?)", (key, value))
+                except sqlite3.Error as e:
+                    print(f"写入翻译缓存失败: {e}")
+
+    def _remember(self, key: bytes, value: str):
+        """写入内存LRU，超出容量时淘汰最久未使用的条目"""
+        self._memory[key] = value
+        self._memory.move_to_end(key)
+        while len(self._memory) > self.max_size:
+            self._memory.popitem(last=False)
+
+    def close(self):
+        """关闭磁盘缓存"""
+        with self._lock:
+            if self._db is not None:
+                self._db.close()
+                self._db = None
@@ -1,61 +1,265 @@
 import sys
 import os
 import json
-import requests
+import functools
+import shutil
+import subprocess
+import threading
+import time
 import platform
 from PyQt6.QtWidgets import (QApplication, QMainWindow, QWidget, QVBoxLayout, 
                            QHBoxLayout, QPushButton, QLabel, QComboBox, 
                            QFileDialog, QProgressBar, QLineEdit, QMessageBox,
-                           QGroupBox, QMenu)
-from PyQt6.QtCore import Qt, QThread, pyqtSignal
+                           QGroupBox, QMenu, QSpinBox)
+from PyQt6.QtCore import Qt, QObject, QRunnable, QThreadPool, QTimer, pyqtSignal
 from PyQt6.QtGui import QAction
-from ppt_xml_translator import PPTXMLTranslator
+
+try:
+    import orjson
+except ImportError:  # orjson 是可选依赖，未安装时使用标准库 json
+    orjson = None
+
+# 当前操作系统，启动时获取一次
+_SYSTEM = platform.system()
+
+@functools.lru_cache(maxsize=1)
+def get_config_dir():
+    """获取配置文件目录（跨平台），首次调用时创建目录"""
+    if _SYSTEM == "Windows":
+        config_dir = os.path.join(os.getenv('APPDATA'), 'PPTTranslator')
+    elif _SYSTEM == "Darwin":  # macOS
+        config_dir = os.path.join(os.path.expanduser('~'), 'Library', 'Application Support', 'PPTTranslator')
+    else:  # Linux 或其他系统
+        config_dir = os.path.join(os.path.expanduser('~'), '.config', 'PPTTranslator')
+    try:
+        os.makedirs(config_dir, exist_ok=True)
+    except OSError as e:
+        print(f"创建配置目录失败: {e}")
+    return config_dir
 
 def open_file_location(file_path):
     """跨平台打开文件所在位置
     Args:
         file_path: 文件路径
     """
-    if platform.system() == "Windows":
-        os.system(f'explorer /select,"{file_path}"')
-    elif platform.system() == "Darwin":  # macOS
-        os.system(f'open -R "{file_path}"')
-    else:  # Linux 或其他系统
-        os.system(f'xdg-open "{os.path.dirname(file_path)}"')
+    # 直接启动程序而不经过shell，路径中的空格、引号和中文不需要转义，也不会阻塞界面
+    try:
+        if _SYSTEM == "Windows":
+            # /select, 单独作为一个参数，只有路径在含空格时被加上引号，explorer 才能识别
+            subprocess.Popen(['explorer', '/select,', os.path.normpath(file_path)])
+        elif _SYSTEM == "Darwin":  # macOS
+            subprocess.Popen(['open', '-R', file_path])
+        else:  # Linux 或其他系统
+            subprocess.Popen(['xdg-open', os.path.dirname(file_path)])
+    except OSError as e:
+        print(f"打开文件位置失败: {e}")
+
+class TaskRunnable(QRunnable):
+    """在线程池中执行一个函数，并把结果或错误通过信号发回界面线程"""
+
+    def __init__(self, func, done_signal, error_signal):
+        super().__init__()
+        self.func = func
+        self.done_signal = done_signal
+        self.error_signal = error_signal
+
+    def run(self):
+        try:
+            result = self.func()
+        except Exception as e:
+            self.error_signal.emit(str(e))
+            return
+        self.done_signal.emit(result)
 
-class TranslationWorker(QThread):
-    """翻译工作线程"""
+class SlideTranslateRunnable(QRunnable):
+    """在线程池中依次翻译一组幻灯片"""
+
+    def __init__(self, job, slide_paths):
+        super().__init__()
+        self.job = job
+        self.slide_paths = slide_paths
+
+    def run(self):
+        job = self.job
+        try:
+            for slide_path in self.slide_paths:
+                # 其他任务出错后不再继续翻译
+                if job.failed:
+                    break
+                job.translator.translate_slide_file(
+                    slide_path,
+                    job.from_lang,
+                    job.to_lang,
+                    token_callback=job.handle_token
+                )
+                job.slide_done.emit()
+        except Exception as e:
+            job.chunk_failed.emit(str(e))
+        finally:
+            job.chunk_done.emit()
+
+class TranslationJob(QObject):
+    """翻译任务协调器（运行在界面线程）
+
+    解压、翻译、打包都在线程池中执行：解压后把幻灯片分成若干组，
+    每组交给一个 SlideTranslateRunnable，多组幻灯片同时向翻译服务发送请求。
+    工作线程只通过信号汇报进度，计数都在界面线程中完成，不需要加锁。
+    """
     progress = pyqtSignal(str)
     finished = pyqtSignal(str)
     error = pyqtSignal(str)
     slide_progress = pyqtSignal(int, int)  # 当前页数，总页数
 
-    def __init__(self, translator, input_file, output_file, from_lang, to_lang):
-        super().__init__()
+    # 工作线程 → 界面线程的内部信号
+    prepared = pyqtSignal(object)
+    prepare_failed = pyqtSignal(str)
+    slide_done = pyqtSignal()
+    chunk_done = pyqtSignal()
+    chunk_failed = pyqtSignal(str)
+    token_received = pyqtSignal(int)
+    packed = pyqtSignal(object)
+    pack_failed = pyqtSignal(str)
+
+    # 进度信息的最小刷新间隔（秒），避免频繁重绘拖慢界面
+    PROGRESS_INTERVAL = 0.1
+
+    def __init__(self, translator, input_file, output_file, from_lang, to_lang, thread_count=2, parent=None):
+        super().__init__(parent)
         self.translator = translator
         self.input_file = input_file
         self.output_file = output_file
         self.from_lang = from_lang
         self.to_lang = to_lang
+        self.thread_count = max(1, thread_count)
+        self.pool = QThreadPool.globalInstance()
+        self.failed = False
+        self._error_message = ""
+        self._temp_dirs = []
+        self._output_dir = None
+        self._total_slides = 0
+        self._done_slides = 0
+        self._pending_chunks = 0
+        self._generated_chars = 0
+        self._last_emit = {}
+        # 多个工作线程同时回调 handle_token，先在这里累计再按间隔发送
+        self._token_lock = threading.Lock()
+        self._pending_chars = 0
+        self._last_token_emit = 0.0
+
+        self.prepared.connect(self._on_prepared)
+        self.prepare_failed.connect(self._on_failed)
+        self.slide_done.connect(self._on_slide_done)
+        self.chunk_done.connect(self._on_chunk_done)
+        self.chunk_failed.connect(self._on_chunk_failed)
+        self.token_received.connect(self._on_token)
+        self.packed.connect(self._on_packed)
+        self.pack_failed.connect(self._on_failed)
+
+    def start(self):
+        """开始翻译：先在线程池中预加载模型并解压文件"""
+        self.pool.setMaxThreadCount(max(self.pool.maxThreadCount(), self.thread_count))
+        self.progress.emit("正在加载模型...")
+        self.pool.start(TaskRunnable(self._prepare, self.prepared, self.prepare_failed))
+
+    def _prepare(self):
+        """（工作线程）预加载模型并解压PPTX，之后直接在解压目录中翻译"""
+        self.translator.warmup()
+        temp_dir = self.translator.extract_pptx(self.input_file)
+        self._temp_dirs.append(temp_dir)
+        return temp_dir, self.translator.list_slides(temp_dir)
+
+    def _on_prepared(self, result):
+        """把幻灯片分组并提交到线程池"""
+        self._output_dir, slides = result
+        self._total_slides = len(slides)
+        if not slides:
+            self._pack()
+            return
 
-    def run(self):
-        try:
-            self.progress.emit("开始翻译...")
-            output_path = self.translator.translate_pptx_file(
-                self.input_file,
-                self.output_file,
-                self.from_lang,
-                self.to_lang,
-                progress_callback=self.handle_progress
-            )
-            self.finished.emit(output_path)
-        except Exception as e:
-            self.error.emit(str(e))
+        self.progress.emit("开始翻译...")
+        chunk_count = min(self.thread_count, len(slides))
+        for i in range(chunk_count):
+            start = i * len(slides) // chunk_count
+            end = (i + 1) * len(slides) // chunk_count
+            self._pending_chunks += 1
+            self.pool.start(SlideTranslateRunnable(self, slides[start:end]))
+
+    def handle_token(self, token):
+        """（工作线程）处理模型流式返回的译文片段"""
+        with self._token_lock:
+            self._pending_chars += len(token)
+            now = time.monotonic()
+            if now - self._last_token_emit < self.PROGRESS_INTERVAL:
+                return
+            self._last_token_emit = now
+            length = self._pending_chars
+            self._pending_chars = 0
+        self.token_received.emit(length)
+
+    def _throttled(self, kind, force=False):
+        """同类进度信息距离上次刷新不足 PROGRESS_INTERVAL 时返回 True"""
+        now = time.monotonic()
+        if not force and now - self._last_emit.get(kind, 0.0) < self.PROGRESS_INTERVAL:
+            return True
+        self._last_emit[kind] = now
+        return False
+
+    def _on_token(self, length):
+        self._generated_chars += length
+        if self._throttled('token'):
+            return
+        current = min(self._done_slides + 1, self._total_slides)
+        self.progress.emit(f"正在翻译第 {current}/{self._total_slides} 页（已生成 {self._generated_chars} 字）...")
+
+    def _on_slide_done(self):
+        self._done_slides += 1
+        # 最后一页总是刷新
+        if self._throttled('slide', force=self._done_slides == self._total_slides):
+            return
+        self.slide_progress.emit(self._done_slides, self._total_slides)
+        self.progress.emit(f"正在翻译第 {self._done_slides}/{self._total_slides} 页...")
 
-    def handle_progress(self, current_slide, total_slides):
-        """处理翻译进度"""
-        self.slide_progress.emit(current_slide, total_slides)
-        self.progress.emit(f"正在翻译第 {current_slide}/{total_slides} 页...")
+    def _on_chunk_failed(self, message):
+        if not self.failed:
+            self.failed = True
+            self._error_message = f"翻译幻灯片时出错: {message}"
+
+    def _on_chunk_done(self):
+        self._pending_chunks -= 1
+        if self._pending_chunks > 0:
+            return
+        # 所有分组结束后再清理或打包，避免删除仍在使用的临时目录
+        if self.failed:
+            self._on_failed(self._error_message)
+        else:
+            self._pack()
+
+    def _pack(self):
+        self.progress.emit("正在生成翻译后的文件...")
+        self.pool.start(TaskRunnable(self._compress, self.packed, self.pack_failed))
+
+    def _compress(self):
+        """（工作线程）打包为PPTX"""
+        self.translator.compress_to_pptx(self._output_dir, self.output_file)
+        return self.output_file
+
+    def _on_packed(self, output_path):
+        self._cleanup()
+        self.finished.emit(output_path)
+
+    def _on_failed(self, message):
+        self.failed = True
+        self._cleanup()
+        if os.path.exists(self.output_file):
+            os.remove(self.output_file)
+        self.error.emit(message)
+
+    def _cleanup(self):
+        """清理临时目录"""
+        for temp_dir in self._temp_dirs:
+            if os.path.exists(temp_dir):
+                shutil.rmtree(temp_dir, ignore_errors=True)
+        self._temp_dirs = []
 
 class PPTTranslatorUI(QMainWindow):
     def __init__(self):
@@ -63,7 +267,14 @@ class PPTTranslatorUI(QMainWindow):
         self.init_ui()
         self.translator = None
         self.worker = None
+        self._last_pct = -1
         self.recent_files = self.load_recent_files()
+        # 最近文件列表延迟写盘：短时间内的多次修改合并为一次写入
+        self._recent_dirty = False
+        self._recent_timer = QTimer(self)
+        self._recent_timer.setSingleShot(True)
+        self._recent_timer.setInterval(500)
+        self._recent_timer.timeout.connect(self._flush_recent_files)
         self.create_menu_bar()
         
         # 根据操作系统调整界面
@@ -71,7 +282,7 @@ class PPTTranslatorUI(QMainWindow):
 
     def adjust_for_platform(self):
         """根据操作系统调整界面"""
-        if platform.system() == "Darwin":  # macOS
+        if _SYSTEM == "Darwin":  # macOS
             # 调整字体大小
             self.setStyleSheet("QLabel { font-size: 13px; } QLineEdit { font-size: 13px; } QPushButton { font-size: 13px; }")
             # 调整按钮大小
@@ -144,7 +355,11 @@ class PPTTranslatorUI(QMainWindow):
         # 模型选择
         model_layout = QHBoxLayout()
         self.model_select = QComboBox()
-        self.model_select.addItems(['llama3:8b', 'qwen:7b', 'qwen:1.8b'])
+        self.model_select.addItems(['llama3:8b', 'qwen:7b', 'qwen:1.8b',
+                                    'vllm:Qwen/Qwen2.5-7B-Instruct-AWQ', 'llamacpp:default'])
+        # 可直接输入模型名，"vllm:" / "llamacpp:" 前缀表示使用对应的推理服务
+        self.model_select.setEditable(True)
+        self.model_select.setToolTip("Ollama模型直接填写名称；vLLM 或 llama.cpp 服务请加 vllm: / llamacpp: 前缀")
         model_layout.addWidget(QLabel("模型:"))
         model_layout.addWidget(self.model_select)
         settings_layout.addLayout(model_layout)
@@ -159,6 +374,17 @@ class PPTTranslatorUI(QMainWindow):
         server_layout.addWidget(test_connection_btn)
         settings_layout.addLayout(server_layout)
 
+        # 并行数设置
+        thread_layout = QHBoxLayout()
+        self.thread_count = QSpinBox()
+        self.thread_count.setRange(1, 16)
+        self.thread_count.setValue(2)
+        self.thread_count.setToolTip("同时翻译的幻灯片组数，也是同时发往服务端的最大请求数，建议与服务端的 OLLAMA_NUM_PARALLEL 一致")
+        thread_layout.addWidget(QLabel("并行数:"))
+        thread_layout.addWidget(self.thread_count)
+        thread_layout.addStretch()
+        settings_layout.addLayout(thread_layout)
+
         settings_group.setLayout(settings_layout)
         layout.addWidget(settings_group)
 
@@ -225,9 +451,7 @@ class PPTTranslatorUI(QMainWindow):
     def load_recent_files(self):
         """加载最近使用的文件列表"""
         try:
-            config_dir = self.get_config_dir()
-            os.makedirs(config_dir, exist_ok=True)
-            recent_files_path = os.path.join(config_dir, 'recent_files.json')
+            recent_files_path = os.path.join(get_config_dir(), 'recent_files.json')
             if os.path.exists(recent_files_path):
                 with open(recent_files_path, 'r', encoding='utf-8') as f:
                     return json.load(f)
@@ -236,25 +460,28 @@ class PPTTranslatorUI(QMainWindow):
         return []
 
     def save_recent_files(self):
-        """保存最近使用的文件列表"""
+        """标记最近使用的文件列表需要保存，500毫秒后统一写盘"""
+        self._recent_dirty = True
+        self._recent_timer.start()
+
+    def _flush_recent_files(self):
+        """把最近使用的文件列表写入磁盘（先写临时文件再替换，避免写到一半时文件损坏）"""
+        if not self._recent_dirty:
+            return
+        self._recent_dirty = False
         try:
-            config_dir = self.get_config_dir()
-            os.makedirs(config_dir, exist_ok=True)
-            recent_files_path = os.path.join(config_dir, 'recent_files.json')
-            with open(recent_files_path, 'w', encoding='utf-8') as f:
-                json.dump(self.recent_files, f, ensure_ascii=False, indent=2)
+            recent_files_path = os.path.join(get_config_dir(), 'recent_files.json')
+            if orjson is not None:
+                data = orjson.dumps(self.recent_files, option=orjson.OPT_INDENT_2)
+            else:
+                data = json.dumps(self.recent_files, ensure_ascii=False, indent=2).encode('utf-8')
+            tmp_path = recent_files_path + '.tmp'
+            with open(tmp_path, 'wb') as f:
+                f.write(data)
+            os.replace(tmp_path, recent_files_path)
         except Exception as e:
             print(f"保存最近文件列表失败: {e}")
 
-    def get_config_dir(self):
-        """获取配置文件目录（跨平台）"""
-        if platform.system() == "Windows":
-            return os.path.join(os.getenv('APPDATA'), 'PPTTranslator')
-        elif platform.system() == "Darwin":  # macOS
-            return os.path.join(os.path.expanduser('~'), 'Library', 'Application Support', 'PPTTranslator')
-        else:  # Linux 或其他系统
-            return os.path.join(os.path.expanduser('~'), '.config', 'PPTTranslator')
-
     def update_recent_files_menu(self):
         """更新最近使用的文件菜单"""
         self.recent_menu.clear()
@@ -311,11 +538,15 @@ class PPTTranslatorUI(QMainWindow):
     def test_server_connection(self):
         """测试服务器连接"""
         try:
-            # 创建翻译器实例
-            translator = PPTXMLTranslator(host=self.server_url.text())
-            # 发送测试请求
-            response = requests.get(f"{self.server_url.text()}/api/version")
-            if response.status_code == 200:
+            # 延迟导入翻译模块，缩短程序启动时间
+            from ppt_xml_translator import PPTXMLTranslator
+
+            # 创建翻译器实例，按所选模型的后端发送测试请求
+            translator = PPTXMLTranslator(
+                model_name=self.model_select.currentText(),
+                host=self.server_url.text()
+            )
+            if translator.test_connection():
                 QMessageBox.information(self, "连接测试", "服务器连接成功！")
             else:
                 QMessageBox.warning(self, "连接测试", "服务器连接失败！")
@@ -364,24 +595,35 @@ class PPTTranslatorUI(QMainWindow):
         self.status_label.setText("正在准备翻译...")
         self.slide_progress.setRange(0, 100)
         self.slide_progress.setValue(0)
+        self._last_pct = -1
 
         # 准备翻译参数
         from_lang = 'zh' if self.from_lang.currentText() == '中文' else 'en'
         to_lang = 'en' if self.to_lang.currentText() == '英文' else 'zh'
 
-        # 创建翻译器实例
-        self.translator = PPTXMLTranslator(
-            model_name=self.model_select.currentText(),
-            host=self.server_url.text()
-        )
+        # 创建翻译器实例，失败时恢复界面并提示错误
+        try:
+            from ppt_xml_translator import PPTXMLTranslator
+            self.translator = PPTXMLTranslator(
+                model_name=self.model_select.currentText(),
+                host=self.server_url.text(),
+                cache_path=os.path.join(get_config_dir(), 'translation_cache.sqlite3'),
+                # 各幻灯片组及其内部的批量翻译共用这一个并发上限
+                n_parallel=self.thread_count.value()
+            )
+        except Exception as e:
+            self.translation_error(f"创建翻译器失败：{str(e)}")
+            return
 
-        # 创建并启动工作线程
-        self.worker = TranslationWorker(
+        # 创建并启动翻译任务
+        self.worker = TranslationJob(
             self.translator,
             self.input_path.text(),
             self.output_path.text(),
             from_lang,
-            to_lang
+            to_lang,
+            thread_count=self.thread_count.value(),
+            parent=self
         )
         self.worker.progress.connect(self.update_progress)
         self.worker.slide_progress.connect(self.update_slide_progress)
@@ -395,7 +637,11 @@ class PPTTranslatorUI(QMainWindow):
 
     def update_slide_progress(self, current, total):
         """更新页面进度"""
-        progress = int((current / total) * 100)
+        progress = int(current * 100 / total)
+        # 百分比没有变化时不重绘进度条
+        if progress == self._last_pct:
+            return
+        self._last_pct = progress
         self.slide_progress.setValue(progress)
         self.slide_progress.setFormat(f"进度: {progress}% ({current}/{total}页)")
 
@@ -428,6 +674,12 @@ class PPTTranslatorUI(QMainWindow):
             f"翻译过程中出错：\n{error_message}"
         )
 
+    def closeEvent(self, event):
+        """关闭窗口前写入尚未保存的最近文件列表"""
+        self._recent_timer.stop()
+        self._flush_recent_files()
+        super().closeEvent(event)
+
 def main():
     app = QApplication(sys.argv)
     # 设置应用程序样式
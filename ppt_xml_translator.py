@@ -43,8 +43,9 @@ PPT XML 翻译器 (PPTXMLTranslator)
    --output: 输出的 PPTX 文件路径（可选）
    --from-lang: 源语言（默认：zh）
    --to-lang: 目标语言（默认：en）
-   --model: Ollama 模型名称
-   --host: Ollama 服务地址
+   --model: 模型名称（加 vllm: / llamacpp: 前缀时使用对应的推理服务）
+   --host: 推理服务地址
+   --cache: 翻译缓存文件路径（可选）
 
 注意事项:
 --------
@@ -58,34 +59,101 @@ PPT XML 翻译器 (PPTXMLTranslator)
 最后更新: 2024-12-21
 """
 
-import xml.etree.ElementTree as ET
+from lxml import etree as ET
+import copy
 import os
 import shutil
-from typing import Callable, List, Dict
+import sys
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from typing import Callable, Dict, Iterator, List, Tuple
 from ollama_service.translate_service import OllamaTranslator
+import fontmath
 import zipfile
 import tempfile
 
+# 解析幻灯片使用的XML解析器：不展开外部实体、不访问网络，
+# 防止构造的PPTX把本地文件内容带入译文（lxml 5.0 之前默认会展开实体）
+_XML_PARSER = ET.XMLParser(resolve_entities=False, no_network=True)
+
+def _first(nodes: list):
+    """返回XPath查询结果中的第一个元素，没有结果时返回 None"""
+    return nodes[0] if nodes else None
+
 class PPTXMLTranslator:
-    def __init__(self, model_name: str = "llama3:8b", host: str = "http://localhost:11434", debug: bool = False):
-        """初始化翻译器"""
-        self.translator = OllamaTranslator(model_name=model_name, host=host)
+    # 本身已经压缩过的文件格式（图片、音视频、内嵌的Office文档），重新打包时直接存储，不再压缩
+    STORED_EXTENSIONS = frozenset({
+        '.png', '.jpg', '.jpeg', '.gif', '.mp3', '.m4a', '.mp4', '.m4v', '.mov', '.wmv',
+        '.xlsx', '.docx', '.pptx', '.zip'
+    })
+    
+    # 解压和打包时复制文件内容的缓冲区大小，较大的缓冲区可减少系统调用次数
+    COPY_BUFFER_SIZE = 1024 * 1024
+    
+    def __init__(self, model_name: str = "llama3:8b", host: str = "http://localhost:11434", debug: bool = False,
+                 cache_path: str = None, n_parallel: int = None):
+        """初始化翻译器
+        Args:
+            model_name: Ollama模型名称
+            host: Ollama服务地址
+            debug: 是否打印调试信息
+            cache_path: 翻译结果磁盘缓存路径（可选，默认只在内存中缓存）
+            n_parallel: 同时发往翻译服务的最大请求数（可选，默认读取环境变量 OLLAMA_PARALLEL）
+        """
+        self.translator = OllamaTranslator(model_name=model_name, host=host, cache_path=cache_path,
+                                           n_parallel=n_parallel)
         self.debug = debug
+        # 非调试模式下 debug_print 为空函数，省去每次调用时的判断
+        self.debug_print = print if debug else (lambda *args, **kwargs: None)
         self.namespaces = {
             'p': "http://schemas.openxmlformats.org/presentationml/2006/main",
             'a': "http://schemas.openxmlformats.org/drawingml/2006/main"
         }
         for prefix, uri in self.namespaces.items():
             ET.register_namespace(prefix, uri)
+        # 预编译所有用到的XPath表达式，避免每次查找时重新解析路径和命名空间
+        self._xpaths = {}
+        self._xp_sp = self._xpath(".//p:sp")
+        self._xp_grpSp = self._xpath(".//p:grpSp")
+        self._xp_p = self._xpath(".//a:p")
+        self._xp_r = self._xpath(".//a:r")
+        self._xp_t = self._xpath(".//a:t")
+        self._xp_has_t = self._xpath("boolean(.//a:t)")
+        self._xp_sz = self._xpath(".//*[@sz]")
+        self._xp_rPr = self._xpath("a:rPr")
+        self._xp_rPr_any = self._xpath(".//a:rPr")
+        self._xp_pPr = self._xpath("a:pPr")
+        self._xp_defRPr = self._xpath("a:defRPr")
+        self._xp_endParaRPr = self._xpath("a:endParaRPr")
+        self._xp_sz_any = self._xpath(".//a:sz")
+        self._xp_txBody = self._xpath(".//a:txBody")
+        self._xp_bodyPr = self._xpath("a:bodyPr")
+        self._xp_autofit = self._xpath("a:noAutofit | a:normAutofit | a:spAutoFit")
+        self._xp_spPr = self._xpath(".//p:spPr")
+        self._xp_grpSpPr = self._xpath("p:grpSpPr")
+        self._xp_xfrm = self._xpath("a:xfrm")
         # PPT标准字号列表（从大到小）
         self.ppt_font_sizes = [72, 48, 44, 40, 36, 32, 28, 24, 20, 18, 16, 14, 12, 11, 10, 9, 8, 7, 6, 5]
         # 定义最小字体大小限制(磅)
         self.min_font_size = 5
+        # 从小到大排列的标准字号，用于二分查找
+        self._ascending_sizes = sorted(self.ppt_font_sizes)
+        # 字号调整结果缓存：(原始字号, 是否译文) -> 调整后字号，一份PPT中不同的字号通常只有十几种
+        self._size_cache = {}
     
-    def debug_print(self, *args, **kwargs):
-        """调试信息打印"""
-        if self.debug:
-            print(*args, **kwargs)
+    def warmup(self) -> bool:
+        """预加载翻译模型"""
+        return self.translator.warmup()
+    
+    def test_connection(self) -> bool:
+        """测试翻译服务连接"""
+        return self.translator.test_connection()
+    
+    def _xpath(self, path: str) -> ET.XPath:
+        """获取编译后的XPath表达式，同一路径只编译一次"""
+        xpath = self._xpaths.get(path)
+        if xpath is None:
+            xpath = self._xpaths[path] = ET.XPath(path, namespaces=self.namespaces)
+        return xpath
     
     def copy_element_style(self, source_elem: ET.Element, target_elem: ET.Element):
         """复制元素的样式属性和子元素"""
@@ -95,7 +163,7 @@ class PPTXMLTranslator:
                 target_elem.set(key, value)
             # 复制子元素
             for child in source_elem:
-                target_elem.append(ET.fromstring(ET.tostring(child)))
+                target_elem.append(copy.deepcopy(child))
     
     def find_element_with_style(self, parent: ET.Element, tag: str) -> tuple[ET.Element, ET.Element]:
         """查找带样式的元素
@@ -105,33 +173,50 @@ class PPTXMLTranslator:
         Returns:
             (元素, 样式元素)的元组
         """
-        elem = parent.find(f".//a:{tag}", self.namespaces)
+        elem = _first(self._xpath(f".//a:{tag}")(parent))
         style = None
         if elem is not None:
-            style = elem.find(f"a:{tag}Pr", self.namespaces)
+            style = _first(self._xpath(f"a:{tag}Pr")(elem))
         return elem, style
     
-    def adjust_element_font_size(self, element: ET.Element, attrs: list[str] = None, is_translation: bool = False):
+    def adjust_element_font_size(self, element: ET.Element, attrs: list[str] = None, is_translation: bool = False,
+                                 steps: int = 1):
         """调整元素的字体大小
         Args:
             element: 要调整的元素
             attrs: 要调整的属性列表，默认为['sz']
             is_translation: 是否是译文
+            steps: 每个属性连续调整的次数，默认为1
         """
         if attrs is None:
-            attrs = ['sz']
+            attrs = ('sz',)
         
+        # 该方法对每个运行块都会调用，属性字典和方法先绑定到局部变量
+        attrib = element.attrib
+        adjust = self.adjust_font_size
         for attr in attrs:
-            if attr in element.attrib:
-                try:
-                    # 尝试将属性值转换为整数
-                    size = int(element.attrib[attr])
-                    new_size = self.adjust_font_size(size, is_translation)
-                    element.set(attr, str(new_size))
-                except ValueError:
-                    # 如果转换失败，说明是特殊值（如'quarter'），保持原值
-                    print(f"警告：遇到特殊字体大小值：{element.attrib[attr]}，保持原值")
-                    continue
+            value = attrib.get(attr)
+            if value is None:
+                continue
+            try:
+                # 尝试将属性值转换为整数
+                size = int(value)
+                for _ in range(steps):
+                    size = adjust(size, is_translation)
+                attrib[attr] = str(size)
+            except ValueError:
+                # 如果转换失败，说明是特殊值（如'quarter'），保持原值
+                print(f"警告：遇到特殊字体大小值：{value}，保持原值")
+    
+    def adjust_run_font_size(self, rPr: ET.Element):
+        """调整文本框中文本运行块的字体属性
+        
+        sz 连续减小两次，与原先整页调整一次、再按文本框调整一次的结果相同；kern、spc、baseline 调整一次
+        Args:
+            rPr: 运行块的 a:rPr 元素
+        """
+        self.adjust_element_font_size(rPr, ['sz'], steps=2)
+        self.adjust_element_font_size(rPr, ['kern', 'spc', 'baseline'])
     
     def create_element_with_style(self, tag: str, parent: ET.Element = None, style_source: ET.Element = None) -> ET.Element:
         """创建带样式的元素
@@ -150,7 +235,7 @@ class PPTXMLTranslator:
         
         # 如果有样式来源，复制样式
         if style_source is not None:
-            style_elem = style_source.find(f"a:{tag}Pr", self.namespaces)
+            style_elem = _first(self._xpath(f"a:{tag}Pr")(style_source))
             if style_elem is not None:
                 new_style = ET.SubElement(new_elem, f"{{{self.namespaces['a']}}}{tag}Pr")
                 self.copy_element_style(style_elem, new_style)
@@ -165,7 +250,16 @@ class PPTXMLTranslator:
         try:
             # 解压PPTX文件
             with zipfile.ZipFile(pptx_path, 'r') as zip_ref:
-                zip_ref.extractall(temp_dir)
+                for info in zip_ref.infolist():
+                    target_path = self._member_path(temp_dir, info.filename)
+                    if target_path is None:
+                        continue
+                    if info.is_dir():
+                        os.makedirs(target_path, exist_ok=True)
+                        continue
+                    os.makedirs(os.path.dirname(target_path), exist_ok=True)
+                    with zip_ref.open(info) as src, open(target_path, 'wb') as dst:
+                        shutil.copyfileobj(src, dst, self.COPY_BUFFER_SIZE)
             
             return temp_dir
         except Exception as e:
@@ -173,21 +267,60 @@ class PPTXMLTranslator:
                 shutil.rmtree(temp_dir)
             raise Exception(f"解压PPTX文件失败: {str(e)}")
     
+    @staticmethod
+    def _member_path(target_dir: str, filename: str) -> str:
+        """计算ZIP成员的解压路径
+        
+        与 ZipFile.extractall 相同，去掉盘符、绝对路径和 ".." 等路径成分，防止文件被写到目标目录之外
+        Returns:
+            解压路径，成员名无效时返回 None
+        """
+        arcname = filename.replace('/', os.path.sep)
+        if os.path.altsep:
+            arcname = arcname.replace(os.path.altsep, os.path.sep)
+        arcname = os.path.splitdrive(arcname)[1]
+        parts = [x for x in arcname.split(os.path.sep) if x not in ('', os.path.curdir, os.path.pardir)]
+        if not parts:
+            return None
+        return os.path.join(target_dir, *parts)
+    
+    @staticmethod
+    def _iter_files(dir_path: str) -> Iterator[Tuple[str, str]]:
+        """遍历目录中的所有文件，顺序与 os.walk 相同
+        Args:
+            dir_path: 要遍历的目录
+        Returns:
+            (文件完整路径, 以正斜杠分隔的相对路径) 的迭代器
+        """
+        # 相对路径随遍历逐级拼接，省去每个文件的 join、relpath 和分隔符替换
+        stack = [("", dir_path)]
+        while stack:
+            rel_dir, current_dir = stack.pop()
+            subdirs = []
+            with os.scandir(current_dir) as entries:
+                for entry in entries:
+                    rel_path = f"{rel_dir}/{entry.name}" if rel_dir else entry.name
+                    if entry.is_dir(follow_symlinks=False):
+                        subdirs.append((rel_path, entry.path))
+                    else:
+                        yield entry.path, rel_path
+            # 逆序入栈，使子目录按列出的顺序处理
+            stack.extend(reversed(subdirs))
+    
     def compress_to_pptx(self, dir_path: str, output_pptx: str):
         """将目录压缩为PPTX文件"""
         try:
             with zipfile.ZipFile(output_pptx, 'w', zipfile.ZIP_DEFLATED) as zip_ref:
                 # 遍历目录中的所有文件
-                for root, _, files in os.walk(dir_path):
-                    for file in files:
-                        # 获取文件的完整路径
-                        file_path = os.path.join(root, file)
-                        # 获取相对路径（用于ZIP文件中的路径）
-                        arcname = os.path.relpath(file_path, dir_path)
-                        # 确保使用正斜杠作为路径分隔符
-                        arcname = arcname.replace(os.path.sep, '/')
-                        # 添加文件到ZIP
-                        zip_ref.write(file_path, arcname)
+                for file_path, arcname in self._iter_files(dir_path):
+                    # 添加文件到ZIP，已压缩的媒体文件直接存储
+                    info = zipfile.ZipInfo.from_file(file_path, arcname)
+                    if os.path.splitext(arcname)[1].lower() in self.STORED_EXTENSIONS:
+                        info.compress_type = zipfile.ZIP_STORED
+                    else:
+                        info.compress_type = zipfile.ZIP_DEFLATED
+                    with open(file_path, 'rb') as src, zip_ref.open(info, 'w') as dst:
+                        shutil.copyfileobj(src, dst, self.COPY_BUFFER_SIZE)
         except Exception as e:
             if os.path.exists(output_pptx):
                 os.remove(output_pptx)
@@ -201,29 +334,40 @@ class PPTXMLTranslator:
     
     def print_element_tree(self, element: ET.Element, level: int = 0):
         """打印元素树结构，用于调试"""
-        indent = "  " * level
-        tag = element.tag.split('}')[-1]  # 移除命名空间前缀
-        attrs = [f"{k}='{v}'" for k, v in element.attrib.items()]
-        attrs_str = " ".join(attrs)
-        
-        if element.text and element.text.strip():
-            print(f"{indent}{tag} {attrs_str}: {element.text.strip()}")
-        else:
-            print(f"{indent}{tag} {attrs_str}")
-        
-        for child in element:
-            self.print_element_tree(child, level + 1)
+        # 用栈代替递归，所有行拼好后一次写出
+        lines = []
+        stack = [(element, level)]
+        while stack:
+            elem, depth = stack.pop()
+            if not isinstance(elem.tag, str):  # 跳过注释和处理指令
+                continue
+            tag = elem.tag.rpartition('}')[2]  # 移除命名空间前缀
+            attrs_str = " ".join(f"{k}='{v}'" for k, v in elem.attrib.items())
+            text = elem.text.strip() if elem.text else ""
+            lines.append(f"{'  ' * depth}{tag} {attrs_str}: {text}" if text else f"{'  ' * depth}{tag} {attrs_str}")
+            stack.extend((child, depth + 1) for child in reversed(elem))
+        if lines:
+            sys.stdout.write("\n".join(lines) + "\n")
     
-    def find_text_elements(self, root: ET.Element) -> List[Dict]:
-        """查找所有文本元素"""
+    def find_text_elements(self, root: ET.Element, shapes: List[ET.Element] = None) -> List[Dict]:
+        """查找所有文本元素
+        Args:
+            root: 幻灯片根元素
+            shapes: 已查找到的文本框列表（可选，省去再次遍历）
+        """
         text_elements = []
         
         # 查找所有文本框（shape）
-        shapes = root.findall(".//p:sp", self.namespaces)
+        if shapes is None:
+            shapes = self._xp_sp(root)
         
         for shape in shapes:
+            # 图片、连接线等没有文本的形状直接跳过，不再逐个查找段落和运行块
+            if not self._xp_has_t(shape):
+                continue
+            
             # 获取文本框中的所有段落
-            paragraphs = shape.findall(".//a:p", self.namespaces)
+            paragraphs = self._xp_p(shape)
             if not paragraphs:
                 continue
             
@@ -234,12 +378,13 @@ class PPTXMLTranslator:
             
             for p in paragraphs:
                 # 打印段落的XML结构
-                print("\n=== 段落XML结构 ===")
-                self.print_element_tree(p)
-                print("==================\n")
+                if self.debug:
+                    print("\n=== 段落XML结构 ===")
+                    self.print_element_tree(p)
+                    print("==================\n")
                 
                 # 获取文本运行块
-                runs = p.findall(".//a:r", self.namespaces)
+                runs = self._xp_r(p)
                 if not runs:
                     continue
                 
@@ -247,21 +392,21 @@ class PPTXMLTranslator:
                 paragraph_text = ""
                 
                 for r in runs:
-                    t = r.find(".//a:t", self.namespaces)
+                    t = _first(self._xp_t(r))
                     if t is not None and t.text:
                         paragraph_text += t.text
                         # 获取样式信息（如果还没有获取到）
                         if shape_style is None:
-                            rPr = r.find("a:rPr", self.namespaces)
+                            rPr = _first(self._xp_rPr(r))
                             if rPr is not None and 'sz' in rPr.attrib:
                                 shape_style = self.get_paragraph_style(p)
-                                print(f"找到文本: {t.text.strip()}, 字体大小: {self.size_to_point(int(rPr.attrib['sz']))}磅")
+                                self.debug_print(f"找到文本: {t.text.strip()}, 字体大小: {self.size_to_point(int(rPr.attrib['sz']))}磅")
                             else:
-                                rPr = r.find(".//a:rPr", self.namespaces)
+                                rPr = _first(self._xp_rPr_any(r))
                                 if rPr is not None and 'sz' in rPr.attrib:
                                     shape_style = self.get_paragraph_style(p)
-                                    print(f"找到文本: {t.text.strip()}, 字体大小: {self.size_to_point(int(rPr.attrib['sz']))}磅")
-                                else:
+                                    self.debug_print(f"找到文本: {t.text.strip()}, 字体大小: {self.size_to_point(int(rPr.attrib['sz']))}磅")
+                                elif self.debug:
                                     print(f"\n=== 运行块XML结构（未找到字体大小） ===")
                                     self.print_element_tree(r)
                                     print("==================\n")
@@ -281,13 +426,15 @@ class PPTXMLTranslator:
                 if shape_style is None and first_paragraph is not None:
                     shape_style = self.get_paragraph_style(first_paragraph)
                     if 'font_size' not in shape_style:
-                        print(f"警告: 无法找到本 '{shape_text.strip()}' 的字体大小设置")
+                        self.debug_print(f"警告: 无法找到本 '{shape_text.strip()}' 的字体大小设置")
                 
+                last_paragraph = paragraphs[-1]
                 text_elements.append({
                     'paragraph': first_paragraph,  # 使用第一个段落作为参考
                     'text': shape_text.strip(),
                     'style': shape_style,
-                    'shape': shape  # 保存文本框引用
+                    'shape': shape,  # 保存文本框引用
+                    'last_paragraph': last_paragraph  # 译文插入在最后一个段落后面
                 })
         
         return text_elements
@@ -295,66 +442,71 @@ class PPTXMLTranslator:
     def get_paragraph_style(self, p_element):
         """获取段落的样式信息"""
         # 打印段落的XML结构
-        print("\n=== 段落样式查找 ===")
-        self.print_element_tree(p_element)
-        print("==================")
+        if self.debug:
+            print("\n=== 段落样式查找 ===")
+            self.print_element_tree(p_element)
+            print("==================")
         
         # 1. 首先从文本运行块rPr中查找
-        r_elements = p_element.findall('.//a:r', self.namespaces)
+        r_elements = self._xp_r(p_element)
         for r in r_elements:
-            r_pr = r.find('a:rPr', self.namespaces)
+            r_pr = _first(self._xp_rPr(r))
             if r_pr is not None:
-                print("找到文本运行块rPr:")
-                self.print_element_tree(r_pr)
+                if self.debug:
+                    print("找到文本运行块rPr:")
+                    self.print_element_tree(r_pr)
                 if 'sz' in r_pr.attrib:
                     try:
                         font_size = self.size_to_point(int(r_pr.attrib['sz']))
-                        print(f"从文本运行块rPr获取到字体大小: {font_size}磅")
+                        self.debug_print(f"从文本运行块rPr获取到字体大小: {font_size}磅")
                         return {'font_size': self.point_to_size(font_size)}
                     except ValueError:
-                        print(f"警告：无法解析字体大小值：{r_pr.attrib['sz']}，尝试其他来源")
+                        self.debug_print(f"警告：无法解析字体大小值：{r_pr.attrib['sz']}，尝试其他来源")
                 else:
-                    print("文本运行块rPr中没有字体大小设置")
+                    self.debug_print("文本运行块rPr中没有字体大小设置")
 
         # 2. 从段落的pPr/defRPr中查找
-        p_pr = p_element.find('a:pPr', self.namespaces)
+        p_pr = _first(self._xp_pPr(p_element))
         if p_pr is not None:
-            print("找到段落pPr:")
-            self.print_element_tree(p_pr)
-            def_rpr = p_pr.find('a:defRPr', self.namespaces)
+            if self.debug:
+                print("找到段落pPr:")
+                self.print_element_tree(p_pr)
+            def_rpr = _first(self._xp_defRPr(p_pr))
             if def_rpr is not None:
-                print("找到defRPr:")
-                self.print_element_tree(def_rpr)
+                if self.debug:
+                    print("找到defRPr:")
+                    self.print_element_tree(def_rpr)
                 if 'sz' in def_rpr.attrib:
                     try:
                         font_size = self.size_to_point(int(def_rpr.attrib['sz']))
-                        print(f"从段落pPr/defRPr获取到字体大小: {font_size}磅")
+                        self.debug_print(f"从段落pPr/defRPr获取到字体大小: {font_size}磅")
                         return {'font_size': self.point_to_size(font_size)}
                     except ValueError:
-                        print(f"警告：无法解析字体大小值：{def_rpr.attrib['sz']}，尝试其他来源")
+                        self.debug_print(f"警告：无法解析字体大小值：{def_rpr.attrib['sz']}，尝试其他来源")
                 else:
-                    print("段落pPr/defRPr中没有字体大小设置")
+                    self.debug_print("段落pPr/defRPr中没有字体大小设置")
             else:
-                print("没有找到defRPr")
+                self.debug_print("没有找到defRPr")
         else:
-            print("没有找到段落pPr")
+            self.debug_print("没有找到段落pPr")
 
         # 3. 从endParaRPr中查找
-        end_para_rpr = p_element.find('a:endParaRPr', self.namespaces)
+        end_para_rpr = _first(self._xp_endParaRPr(p_element))
         if end_para_rpr is not None:
-            print("找到endParaRPr:")
-            self.print_element_tree(end_para_rpr)
+            if self.debug:
+                print("找到endParaRPr:")
+                self.print_element_tree(end_para_rpr)
             if 'sz' in end_para_rpr.attrib:
                 try:
                     font_size = self.size_to_point(int(end_para_rpr.attrib['sz']))
-                    print(f"从endParaRPr获取字体大小: {font_size}磅")
+                    self.debug_print(f"从endParaRPr获取字体大小: {font_size}磅")
                     return {'font_size': self.point_to_size(font_size)}
                 except ValueError:
-                    print(f"警告：无法解析字体大小值：{end_para_rpr.attrib['sz']}，使用默认值")
+                    self.debug_print(f"警告：无法解析字体大小值：{end_para_rpr.attrib['sz']}，使用默认值")
             else:
-                print("endParaRPr中没有字体大小设置")
+                self.debug_print("endParaRPr中没有字体大小设置")
         else:
-            print("没有找到endParaRPr")
+            self.debug_print("没有找到endParaRPr")
 
         # 如果所有尝试都失败，使用默认字体大小（18磅）并减小两个标准字号变为14磅）
         default_size = 18.0
@@ -362,11 +514,11 @@ class PPTXMLTranslator:
         for i, std_size in enumerate(self.ppt_font_sizes):
             if std_size <= 14.0:
                 original_size = std_size
-                print(f"使用默认字体大小: 18.0磅 -> {original_size}磅")
+                self.debug_print(f"使用默认字体大小: 18.0磅 -> {original_size}磅")
                 return {'font_size': self.point_to_size(original_size)}
         
         # 如果找不到14磅，使用最小字号
-        print(f"使用默认字体大小: 18.0磅 -> {self.min_font_size}磅")
+        self.debug_print(f"使用默认字体大小: 18.0磅 -> {self.min_font_size}磅")
         return {'font_size': self.point_to_size(self.min_font_size)}
 
     def get_font_size_from_rpr(self, rpr_element):
@@ -383,7 +535,7 @@ class PPTXMLTranslator:
                 return None
             
         # 从子元素中获取
-        sz_element = rpr_element.find('.//a:sz', self.namespaces)
+        sz_element = _first(self._xp_sz_any(rpr_element))
         if sz_element is not None and 'val' in sz_element.attrib:
             try:
                 return self.size_to_point(int(sz_element.attrib['val']))
@@ -395,11 +547,11 @@ class PPTXMLTranslator:
     
     def point_to_size(self, point_size: float) -> int:
         """将磅值转换为XML中的字号值（1磅 = 100单位）"""
-        return int(point_size * 100)
+        return fontmath.point_to_size(point_size)
     
     def size_to_point(self, size: int) -> float:
         """将XML中的字号值转换为磅值"""
-        return size / 100
+        return fontmath.size_to_point(size)
     
     def get_next_smaller_size(self, current_size: float) -> float:
         """获取下一个更小的标准字号
@@ -408,23 +560,8 @@ class PPTXMLTranslator:
         Returns:
             下一个更小的标准字号（磅）
         """
-        # 将当前大小四舍五入到最接近的0.5
-        rounded_size = round(current_size * 2) / 2
-        
-        # 当前大小在标准字号中的位置
-        for i, std_size in enumerate(self.ppt_font_sizes):
-            if rounded_size >= std_size:
-                # 如果找到第一个小于等于当前大小的标准字号
-                if i + 2 < len(self.ppt_font_sizes):
-                    # 返回后两个标准字号（相当于减小两次）
-                    return self.ppt_font_sizes[i + 2]
-                else:
-                    # 如果已经接近列表末尾，返回最小值
-                    return self.min_font_size
-        
-        # 如果当前大小小于所有标准字号，返回最小值
-        return self.min_font_size
-        
+        return fontmath.next_smaller_size(current_size, self._ascending_sizes, self.min_font_size)
+    
     def adjust_font_size(self, size: int, is_translation: bool = False) -> int:
         """调整字体大小
         Args:
@@ -433,107 +570,106 @@ class PPTXMLTranslator:
         Returns:
             调整后的字体大小（EMU单位）
         """
-        # 转换为磅值
-        point_size = self.size_to_point(size)
-        
-        # 获取下一个更小的标准字号
-        new_point_size = self.get_next_smaller_size(point_size)
-        
-        # 如果是译文，再减小一次字号
-        if is_translation:
-            new_point_size = self.get_next_smaller_size(new_point_size)
-        
-        # 确保不小于最小字号
-        new_point_size = max(new_point_size, self.min_font_size)
-        
-        # 转换回EMU单位
-        return self.point_to_size(new_point_size)
+        key = (size, is_translation)
+        new_size = self._size_cache.get(key)
+        if new_size is None:
+            new_size = self._size_cache[key] = fontmath.adjust_font_size(
+                size, is_translation, self._ascending_sizes, self.min_font_size
+            )
+        return new_size
     
     def create_translated_paragraphs(self, original_p: ET.Element, translated_text: str) -> List[ET.Element]:
-        """创建翻译后的段落列表，保持原始样式"""
-        paragraphs = []
+        """创建翻译后的段落列表，保持原始样式
         
+        按原段落的样式只构建一次段落模板，每行译文复制模板后填入文本
+        """
         # 获取原始样式元素
         original_r, original_rPr = self.find_element_with_style(original_p, "r")
         
+        # 创建段落模板
+        template_p = self.create_element_with_style("p", style_source=original_p)
+        
+        # 创建文本运行块
+        template_r = self.create_element_with_style("r", parent=template_p, style_source=original_r)
+        
+        # 调整字体大小
+        if original_rPr is not None and 'sz' in original_rPr.attrib:
+            new_rPr = _first(self._xp_rPr(template_r))
+            if new_rPr is not None:
+                self.adjust_element_font_size(new_rPr, is_translation=True)
+        
+        # 文本元素，复制模板后填入每行译文
+        ET.SubElement(template_r, f"{{{self.namespaces['a']}}}t")
+        
         # 处理每段文本
-        texts = translated_text.split('\n')
-        for text in texts:
-            # 创建新段落
-            new_p = self.create_element_with_style("p", style_source=original_p)
+        paragraphs = []
+        for text in translated_text.split('\n'):
+            new_p = copy.deepcopy(template_p)
+            # 模板中文本运行块是段落的最后一个子元素，文本元素是运行块的最后一个子元素
+            new_p[-1][-1].text = text
             paragraphs.append(new_p)
-            
-            # 创建文本运行块
-            new_r = self.create_element_with_style("r", parent=new_p, style_source=original_r)
-            
-            # 调整字体大小
-            if original_rPr is not None and 'sz' in original_rPr.attrib:
-                new_rPr = new_r.find("a:rPr", self.namespaces)
-                if new_rPr is not None:
-                    self.adjust_element_font_size(new_rPr, is_translation=True)
-            
-            # 添加文本
-            new_t = ET.SubElement(new_r, f"{{{self.namespaces['a']}}}t")
-            new_t.text = text
         
         return paragraphs
     
-    def set_auto_fit(self, shape_tree: ET.Element):
-        """设置文本框自动调整大小"""
-        # 包括处理组合形状和普通形状
-        def process_shapes(parent_element):
-            # 处理普通形状
-            for sp in parent_element.findall(".//p:sp", self.namespaces):
-                self._set_shape_auto_fit(sp)
-            
-            # 处理组合形状
-            for grp_sp in parent_element.findall(".//p:grpSp", self.namespaces):
-                # 移除组合形状的固定大小限制
-                grp_sp_pr = grp_sp.find("p:grpSpPr", self.namespaces)
-                if grp_sp_pr is not None:
-                    xfrm = grp_sp_pr.find("a:xfrm", self.namespaces)
-                    if xfrm is not None:
-                        # 保存原始变换信息
-                        original_off = (xfrm.get('off', ''), )  # 位置偏移
-                        original_ext = (xfrm.get('ext', ''), )  # 范围扩展
-                        original_choff = (xfrm.get('chOff', ''), )  # 子元素偏移
-                        original_chext = (xfrm.get('chExt', ''), )  # 子元素范围
-                        
-                        # 移除可能限制大小的属性
-                        for attr in ['cx', 'cy']:
-                            if attr in xfrm.attrib:
-                                del xfrm.attrib[attr]
-                        
-                        # 确保保持相对位置缩放
-                        if original_off[0]:
-                            xfrm.set('off', original_off[0])
-                        if original_ext[0]:
-                            xfrm.set('ext', original_ext[0])
-                        if original_choff[0]:
-                            xfrm.set('chOff', original_choff[0])
-                        if original_chext[0]:
-                            xfrm.set('chExt', original_chext[0])
+    def set_auto_fit(self, shape_tree: ET.Element, shapes: List[ET.Element] = None,
+                     groups: List[ET.Element] = None):
+        """设置文本框自动调整大小
+        Args:
+            shape_tree: 形状树（或整个幻灯片）的根元素
+            shapes: 已查找到的普通形状列表（可选，省去再次遍历）
+            groups: 已查找到的组合形状列表（可选，省去再次遍历）
+        """
+        # 后代查找已包含组合形状（含嵌套组合）内的所有形状，每个形状只需处理一次
+        if shapes is None:
+            shapes = self._xp_sp(shape_tree)
+        if groups is None:
+            groups = self._xp_grpSp(shape_tree)
+        
+        # 处理普通形状
+        for sp in shapes:
+            self._set_shape_auto_fit(sp)
+        
+        # 处理组合形状
+        for grp_sp in groups:
+            self._set_group_auto_fit(grp_sp)
+    
+    def _set_group_auto_fit(self, grp_sp: ET.Element):
+        """移除组合形状的固定大小限制"""
+        grp_sp_pr = _first(self._xp_grpSpPr(grp_sp))
+        if grp_sp_pr is not None:
+            xfrm = _first(self._xp_xfrm(grp_sp_pr))
+            if xfrm is not None:
+                # 保存原始变换信息
+                original_off = (xfrm.get('off', ''), )  # 位置偏移
+                original_ext = (xfrm.get('ext', ''), )  # 范围扩展
+                original_choff = (xfrm.get('chOff', ''), )  # 子元素偏移
+                original_chext = (xfrm.get('chExt', ''), )  # 子元素范围
                 
-                # 递归处理组合形状内的所有形状
-                process_shapes(grp_sp)
-        
-        # 开始处理形状树
-        process_shapes(shape_tree)
+                # 移除可能限制大小的属性
+                for attr in ['cx', 'cy']:
+                    if attr in xfrm.attrib:
+                        del xfrm.attrib[attr]
+                
+                # 确保保持相对位置缩放
+                if original_off[0]:
+                    xfrm.set('off', original_off[0])
+                if original_ext[0]:
+                    xfrm.set('ext', original_ext[0])
+                if original_choff[0]:
+                    xfrm.set('chOff', original_choff[0])
+                if original_chext[0]:
+                    xfrm.set('chExt', original_chext[0])
     
     def _set_shape_auto_fit(self, sp: ET.Element):
         """为单个形状设置自动调整属性"""
-        tx_body = sp.find(".//a:txBody", self.namespaces)
+        tx_body = _first(self._xp_txBody(sp))
         if tx_body is not None:
-            body_pr = tx_body.find("a:bodyPr", self.namespaces)
+            body_pr = _first(self._xp_bodyPr(tx_body))
             if body_pr is None:
                 body_pr = ET.SubElement(tx_body, f"{{{self.namespaces['a']}}}bodyPr")
             
             # 移除所有现有的自动调整设置
-            for auto_fit in body_pr.findall("a:noAutofit", self.namespaces):
-                body_pr.remove(auto_fit)
-            for auto_fit in body_pr.findall("a:normAutofit", self.namespaces):
-                body_pr.remove(auto_fit)
-            for auto_fit in body_pr.findall("a:spAutoFit", self.namespaces):
+            for auto_fit in self._xp_autofit(body_pr):
                 body_pr.remove(auto_fit)
             
             # 移除可能限制自动调整的属性
@@ -551,10 +687,10 @@ class PPTXMLTranslator:
             sp_auto_fit = ET.SubElement(body_pr, f"{{{self.namespaces['a']}}}spAutoFit")
             
             # 检查并调整形状属性
-            sp_pr = sp.find(".//p:spPr", self.namespaces)
+            sp_pr = _first(self._xp_spPr(sp))
             if sp_pr is not None:
                 # 除固定变换属性
-                xfrm = sp_pr.find("a:xfrm", self.namespaces)
+                xfrm = _first(self._xp_xfrm(sp_pr))
                 if xfrm is not None:
                     # 保存原始变换信息
                     original_off = xfrm.get('off', '')  # 位置偏移
@@ -571,92 +707,64 @@ class PPTXMLTranslator:
                     if original_ext:
                         xfrm.set('ext', original_ext)
     
-    def translate_slide(self, slide_path: str, translator_func: Callable[[str], str]):
-        """翻译单个幻灯片文件"""
+    def translate_slide(self, slide_path: str, translator_func: Callable[[str], str],
+                        batch_translator_func: Callable[[List[str]], List[str]] = None):
+        """翻译单个幻灯片文件
+        Args:
+            slide_path: 幻灯片XML文件路径
+            translator_func: 翻译单个文本的函数
+            batch_translator_func: 一次翻译多个文本的函数（可选），提供时整页文本只调用一次
+        """
         self.debug_print(f"\n处理幻灯片: {slide_path}")
         
-        # 解析XML
-        tree = ET.parse(slide_path)
+        # 解析XML，形状和组合形状只查找一次，后续各步骤共用
+        tree = ET.parse(slide_path, _XML_PARSER)
         root = tree.getroot()
+        shapes = self._xp_sp(root)
+        groups = self._xp_grpSp(root)
         
-        # 查找所有可能包含字体大小设置的元素
-        size_elements = root.findall(".//*[@sz]", self.namespaces)
-        self.debug_print(f"找到 {len(size_elements)} 个包含字体大小设置的元素")
+        # 查找所有文本元素
+        text_elements = self.find_text_elements(root, shapes)
         
-        # 调整所有字体大小设置
+        # 调整字体大小，每个元素只调整一次：先调整文本框中文本运行块的 rPr
+        run_props = set()
+        for elem in text_elements:
+            for p in self._xp_p(elem['shape']):
+                for r in self._xp_r(p):
+                    rPr = _first(self._xp_rPr(r))
+                    if rPr is not None and rPr not in run_props:
+                        run_props.add(rPr)
+                        self.adjust_run_font_size(rPr)
+        
+        # 其余包含字体大小设置的元素只调整 sz
+        size_elements = self._xp_sz(root)
+        self.debug_print(f"找到 {len(size_elements)} 个包含字体大小设置的元素")
         for elem in size_elements:
-            self.adjust_element_font_size(elem)
+            if elem not in run_props:
+                self.adjust_element_font_size(elem)
         
-        # 查找所有文本元素
-        text_elements = self.find_text_elements(root)
+        # 整页文本一起翻译，减少与翻译服务的往返次数
+        translations = None
+        if batch_translator_func is not None and text_elements:
+            translations = batch_translator_func([elem['text'] for elem in text_elements])
         
         # 处理每个文本元素
-        for elem in text_elements:
+        for elem_index, elem in enumerate(text_elements):
             original_text = elem['text']
             self.debug_print(f"\n处理文本: {original_text}")
             
-            # 获取文本框中的所有段落并整字体大小
-            shape = elem['shape']
-            for p in shape.findall(".//a:p", self.namespaces):
-                for r in p.findall(".//a:r", self.namespaces):
-                    rPr = r.find("a:rPr", self.namespaces)
-                    if rPr is not None:
-                        self.adjust_element_font_size(rPr, ['sz', 'kern', 'spc', 'baseline'])
-            
-            # 记录原文的换行位置
-            line_breaks = []
-            current_pos = 0
-            for line in original_text.split('\n'):
-                current_pos += len(line)
-                line_breaks.append(current_pos)
-            
             # 获取翻译
-            translated_text = translator_func(original_text)
+            if translations is not None:
+                translated_text = translations[elem_index]
+            else:
+                translated_text = translator_func(original_text)
             if not translated_text:
                 continue
             
             self.debug_print(f"翻译: {original_text} -> {translated_text}")
             
             # 根据原文的换行位置对译文进行分段
-            translated_lines = []
-            last_pos = 0
-            total_len = len(translated_text)
-            ratio = total_len / len(original_text)
-            
-            for break_pos in line_breaks:
-                # 按照原文换行位置的比例计算译文的换行位置
-                translated_break_pos = int(break_pos * ratio)
-                # 在最接近的单词边界处换行
-                if translated_break_pos < total_len:
-                    # 向后查找空格或标点
-                    space_pos = translated_text.find(' ', translated_break_pos)
-                    punct_pos = -1
-                    for punct in '.,:;?!':
-                        pos = translated_text.find(punct, translated_break_pos)
-                        if pos != -1 and (punct_pos == -1 or pos < punct_pos):
-                            punct_pos = pos + 1
-                    
-                    # 使用最近的分隔位置
-                    if space_pos != -1 and punct_pos != -1:
-                        break_pos = min(space_pos, punct_pos)
-                    elif space_pos != -1:
-                        break_pos = space_pos
-                    elif punct_pos != -1:
-                        break_pos = punct_pos
-                    else:
-                        break_pos = translated_break_pos
-                    
-                    # 提取这一行文本
-                    line = translated_text[last_pos:break_pos].strip()
-                    if line:
-                        translated_lines.append(line)
-                    last_pos = break_pos
-            
-            # 添加最后一行
-            if last_pos < total_len:
-                last_line = translated_text[last_pos:].strip()
-                if last_line:
-                    translated_lines.append(last_line)
+            translated_lines = fontmath.split_translation(original_text, translated_text)
             
             # 将处理后的译文重新组合
             processed_translation = '\n'.join(translated_lines)
@@ -664,59 +772,85 @@ class PPTXMLTranslator:
             # 创建翻译后的段落列表
             translated_paragraphs = self.create_translated_paragraphs(elem['paragraph'], processed_translation)
             
-            # 将翻译段落插入到最后一个段落后面
-            shape = elem['shape']  # 获取文本框引用
-            paragraphs = shape.findall(".//a:p", self.namespaces)
-            if paragraphs:
-                # 找到最后一个段落的父元素
-                last_p = paragraphs[-1]
-                parent = None
-                for p in root.findall(".//a:p/..", self.namespaces):
-                    if last_p in list(p):
-                        parent = p
-                        break
-                
-                if parent is not None:
-                    # 获取最后一个段落的索引
-                    children = list(parent)
-                    index = children.index(last_p)
-                    # 插入所有翻译段落
-                    for i, translated_p in enumerate(translated_paragraphs):
-                        parent.insert(index + 1 + i, translated_p)
+            # 将翻译段落依次插入到最后一个段落后面，直接挂在前一个兄弟节点之后，无需查找父元素和下标
+            anchor = elem['last_paragraph']
+            for translated_p in translated_paragraphs:
+                anchor.addnext(translated_p)
+                anchor = translated_p
         
         # 设置文本框自动调整
-        self.set_auto_fit(root)
+        self.set_auto_fit(root, shapes, groups)
         
         # 保存修改
-        tree.write(slide_path, encoding="UTF-8", xml_declaration=True)
+        tree.write(slide_path, encoding="UTF-8", xml_declaration=True, standalone=True)
     
-    def translate_pptx(self, input_dir: str, output_dir: str, from_lang="zh", to_lang="en", progress_callback=None):
-        """翻译整个PPT文件夹"""
-        # 准备输出目录
-        self.prepare_output_dir(input_dir, output_dir)
+    def list_slides(self, pptx_dir: str) -> List[str]:
+        """列出解压目录中的所有幻灯片文件，按页码排序"""
+        slides_dir = os.path.join(pptx_dir, "ppt", "slides")
+        if not os.path.exists(slides_dir):
+            return []
+        slides = [f for f in os.listdir(slides_dir)
+                  if f.startswith("slide") and f.endswith(".xml")]
+        # slide10.xml 应排在 slide9.xml 之后
+        slides.sort(key=lambda f: (len(f), f))
+        return [os.path.join(slides_dir, f) for f in slides]
+    
+    def translate_slide_file(self, slide_path: str, from_lang="zh", to_lang="en", token_callback=None):
+        """用当前翻译服务翻译单个幻灯片文件
+        Args:
+            token_callback: 模型每生成一段译文时调用 token_callback(文本片段)
+        """
+        self.translate_slide(
+            slide_path,
+            lambda text: self.translator.translate(text, from_lang=from_lang, to_lang=to_lang,
+                                                   on_token=token_callback),
+            lambda texts: self.translator.batch_translate(texts, from_lang=from_lang, to_lang=to_lang,
+                                                          on_token=token_callback)
+        )
+    
+    def translate_pptx(self, input_dir: str, output_dir: str, from_lang="zh", to_lang="en", progress_callback=None,
+                       token_callback=None, max_workers: int = None):
+        """翻译整个PPT文件夹
+        Args:
+            progress_callback: 每完成一页时调用 progress_callback(已完成页数, 总页数)
+            token_callback: 模型每生成一段译文时调用 token_callback(文本片段)，可能在多个线程中被调用
+            max_workers: 同时翻译的幻灯片数，默认与翻译服务的并发请求数相同；
+                无论开多少个线程，同时发出的请求数都不超过翻译服务的 n_parallel
         
-        # 遍历处理所有幻灯片文件
-        slides_dir = os.path.join(output_dir, "ppt", "slides")
-        if os.path.exists(slides_dir):
-            try:
-                # 获取所有幻灯片文件
-                slides = [f for f in os.listdir(slides_dir) 
-                         if f.startswith("slide") and f.endswith(".xml")]
-                total_slides = len(slides)
-                
-                for i, filename in enumerate(slides, 1):
-                    slide_path = os.path.join(slides_dir, filename)
-                    print(f"正在翻译: {filename}")
-                    self.translate_slide(
-                        slide_path,
-                        lambda text: self.translator.translate(text, from_lang=from_lang, to_lang=to_lang)
-                    )
-                    if progress_callback:
-                        progress_callback(i, total_slides)
-            except Exception as e:
-                raise Exception(f"翻译幻灯片时出错: {str(e)}")
-    
-    def translate_pptx_file(self, input_pptx: str, output_pptx: str = None, from_lang="zh", to_lang="en", progress_callback=None):
+        input_dir 与 output_dir 相同时直接在原目录中翻译，不再复制整个目录
+        """
+        # 准备输出目录
+        if os.path.abspath(input_dir) != os.path.abspath(output_dir):
+            self.prepare_output_dir(input_dir, output_dir)
+        
+        # 各幻灯片是互不相关的XML文件，多个线程同时翻译，让等待翻译服务的时间相互重叠
+        slides = self.list_slides(output_dir)
+        total_slides = len(slides)
+        if not slides:
+            return
+        if max_workers is None:
+            max_workers = self.translator.n_parallel
+        try:
+            with ThreadPoolExecutor(max_workers=max(1, min(max_workers, total_slides))) as executor:
+                futures = {executor.submit(self.translate_slide_file, slide_path, from_lang, to_lang, token_callback):
+                           slide_path for slide_path in slides}
+                try:
+                    for i, future in enumerate(as_completed(futures), 1):
+                        future.result()
+                        # 只在当前线程输出进度，避免多个线程同时打印时行内容交错
+                        print(f"已翻译: {os.path.basename(futures[future])} ({i}/{total_slides})")
+                        if progress_callback:
+                            progress_callback(i, total_slides)
+                except Exception:
+                    # 出错时取消尚未开始的幻灯片
+                    for future in futures:
+                        future.cancel()
+                    raise
+        except Exception as e:
+            raise Exception(f"翻译幻灯片时出错: {str(e)}")
+    
+    def translate_pptx_file(self, input_pptx: str, output_pptx: str = None, from_lang="zh", to_lang="en", progress_callback=None,
+                            token_callback=None):
         """翻译PPTX文件"""
         # 如果未指定输出文件路径，在输入文件旁边创建
         if output_pptx is None:
@@ -724,21 +858,19 @@ class PPTXMLTranslator:
             output_pptx = f"{base_name}_translated.pptx"
         
         temp_dir = None
-        temp_output_dir = None
         
         try:
             # 解压PPTX
             print(f"正在解压: {input_pptx}")
             temp_dir = self.extract_pptx(input_pptx)
-            temp_output_dir = tempfile.mkdtemp(prefix="pptx_translated_")
             
-            # 翻译
+            # 翻译（解压目录是临时目录，直接在其中修改幻灯片，省去复制整个目录）
             print("正在翻译...")
-            self.translate_pptx(temp_dir, temp_output_dir, from_lang, to_lang, progress_callback)
+            self.translate_pptx(temp_dir, temp_dir, from_lang, to_lang, progress_callback, token_callback)
             
             # 压缩为新的PPTX
             print(f"正在生成翻译后的文件: {output_pptx}")
-            self.compress_to_pptx(temp_output_dir, output_pptx)
+            self.compress_to_pptx(temp_dir, output_pptx)
             
             print("翻译完成!")
             return output_pptx
@@ -753,8 +885,6 @@ class PPTXMLTranslator:
             # 清理临时目录
             if temp_dir and os.path.exists(temp_dir):
                 shutil.rmtree(temp_dir)
-            if temp_output_dir and os.path.exists(temp_output_dir):
-                shutil.rmtree(temp_output_dir)
 
 
 
@@ -767,15 +897,20 @@ def main():
     parser.add_argument('--output', '-o', help='输出的PPTX文件路径（可选，默认在输入文件旁边创建）')
     parser.add_argument('--from-lang', default='zh', choices=['zh', 'en'], help='源语言 (默认: zh)')
     parser.add_argument('--to-lang', default='en', choices=['zh', 'en'], help='目标语言 (默认: en)')
-    parser.add_argument('--model', default='llama3:8b', help='Ollama模型名称 (默认: llama3:8b)')
-    parser.add_argument('--host', default='http://localhost:2342', help='Ollama服务地址 (默认: http://localhost:2342)')
+    parser.add_argument('--model', default='llama3:8b',
+                        help='模型名称，加 vllm: / llamacpp: 前缀时使用对应的推理服务 (默认: llama3:8b)')
+    parser.add_argument('--host', default='http://localhost:2342', help='推理服务地址 (默认: http://localhost:2342)')
+    parser.add_argument('--cache', help='翻译缓存文件路径（可选，重复运行时复用已有译文）')
     
     args = parser.parse_args()
     
     # 创建翻译器实例
-    translator = PPTXMLTranslator(model_name=args.model, host=args.host)
+    translator = PPTXMLTranslator(model_name=args.model, host=args.host, cache_path=args.cache)
     
     try:
+        # 预加载模型
+        translator.warmup()
+        
         # 执行翻译
         print(f"开始处理文件: {args.input}")
         output_file = translator.translate_pptx_file(